@@ -1,30 +1,91 @@
+import os
+import random
+import threading
 import time
-from datetime import datetime, timedelta, timezone
-from typing import Tuple
+from datetime import datetime, timezone
+from typing import Optional, Tuple
 
 from flask import Flask, render_template, request, session
 from flask_login import LoginManager, current_user, logout_user
-from pymongo.errors import ServerSelectionTimeoutError
-
-from app.config import APP_SECRET, ENV, USER_LOGIN_TIMEOUT
-from app.helpers.users import UserUtils
-from app.logging import logger, return_client_ip
+from jinja2 import FileSystemBytecodeCache
+from pymongo.errors import ConnectionFailure, PyMongoError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app.config import (
+    APP_SECRET,
+    ENV,
+    MONGO_RETRY_BASE,
+    MONGO_RETRY_CAP,
+    MONGO_RETRY_MAX_ATTEMPTS,
+    PROXY_TRUSTED_HOPS,
+    USER_ACTIVITY_REFRESH,
+    USER_LOGIN_TIMEOUT,
+)
+from app.logging import get_client_ip, logger
 from app.models.users import UserInfo
-from app.mongo import mongo_connection
-from app.views import backstage_bp, frontstage_bp, main_bp
+
+# Requests under these paths are not logged by `logging_request()`
+_UNLOGGED_PATH_PREFIXES = ("/static/", "/_debug_toolbar/")
+
+
+def _probe_mongo(app: Flask) -> None:
+    """
+    Checks the MongoDB connection with capped exponential backoff, and creates the indexes once connected.
+    Only connection failures are retried. Errors like a failed authentication or index build fail right away.
+    Sets `DB_READY` in the app config once the database answers, so the app starts serving requests.
+
+    If the database can't be set up, `DB_FAILED` is set and the process exits,
+    so that the process manager restarts it instead of leaving it answering 503 forever.
+    """
+    from app.mongo import create_indexes, mongo_connection
+
+    for attempt in range(MONGO_RETRY_MAX_ATTEMPTS):
+        try:
+            with mongo_connection() as mongodb:
+                mongodb.client.server_info()
+                mongodb.probe_server_features()
+                create_indexes(mongodb)
+                app.config["DB_READY"] = True
+                logger.debug("MongoDB connected.")
+                return
+        except ConnectionFailure:
+            delay = min(MONGO_RETRY_CAP, MONGO_RETRY_BASE * 2**attempt) + random.uniform(0, 1)
+            logger.error(
+                "MongoDB is NOT connected (attempt %s/%s). Retry in %.1f secs.",
+                attempt + 1,
+                MONGO_RETRY_MAX_ATTEMPTS,
+                delay,
+            )
+            time.sleep(delay)
+        except PyMongoError as e:
+            # e.g. authentication failed or an index can't be built, which retrying won't fix
+            logger.error("MongoDB setup failed: %s", e)
+            break
+    else:
+        logger.error("MongoDB is still not connected after %s attempts.", MONGO_RETRY_MAX_ATTEMPTS)
+
+    app.config["DB_FAILED"] = True
+    logger.error("Exiting, as the app can't serve requests without MongoDB.")
+    logger.flush()
+    os._exit(1)
 
 
 def create_app() -> Flask:
     """
     In this `create_app()` function, we initialize the Flask app configure by the following steps:
     - Set the secret key for the app.
+    - Trust the reverse proxy's X-Forwarded-For entry for the client address if the environment is set to `prod`.
     - Initialize the debug toolbar if the environment is set to `dev`.
+    - Cache compiled templates on disk.
     - Initialize the login manager.
     - Define the user loader function for the login manager.
     - Define a function to log out inactive users.
     - Register error handlers for 404 and 500 errors.
     - Register the blueprints for the app.
-    - Check the MongoDB connection before starting the app.
+    - Register the `backfill-post-content` and `backfill-paging-counts` CLI commands.
+    - Start flushing the buffered view/read counts in a background thread.
+    - Check the MongoDB connection in a background thread. Requests are answered with 503 until it succeeds,
+      and the process exits if it fails for good.
 
     If all the steps are completed successfully, the function returns the Flask app instance.
     """
@@ -32,6 +93,11 @@ def create_app() -> Flask:
     logger.info("App initialization started.")
     app.secret_key = APP_SECRET
 
+    # production environment configuration
+    # The client address is taken from the X-Forwarded-For entries appended by the trusted proxies only.
+    if ENV == "prod":
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_TRUSTED_HOPS)
+
     # develop environment configuration
     if ENV == "dev":
         app.config["DEBUG"] = True
@@ -43,6 +109,13 @@ def create_app() -> Flask:
         app.config["DEBUG_TB_INTERCEPT_REDIRECTS"] = False
         logger.debug("Debugtoolbar initialized.")
 
+    # Template configuration
+    # Compiled templates are cached on disk and shared across workers,
+    # and template files are only re-checked for changes in the develop environment.
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    app.jinja_env.auto_reload = ENV == "dev"
+    logger.debug("Template cache initialized.")
+
     # Login manager configuration
     login_manager = LoginManager()
     login_manager.login_view = "main.login"
@@ -50,36 +123,54 @@ def create_app() -> Flask:
     login_manager.init_app(app)
     logger.debug("Login manager initialized.")
 
+    # The web stack is imported here rather than at module level,
+    # so importing `app.config` or other light modules doesn't pull in the views and the database client.
+    from app.helpers.users import UserUtils, user_info_cache
+    from app.mongo import mongodb
+
+    user_utils = UserUtils(mongodb)
+
     @login_manager.user_loader
     def user_loader(username: str) -> UserInfo:
         """
-        Load user information from the database.
+        Load user information from the cache, or from the database if it's not cached yet.
         Returns an instance of UserInfo if the user exists, otherwise None.
         """
-        with mongo_connection() as mongodb:
-            user_utils = UserUtils(mongodb)
-            user = user_utils.get_user_info(username)
-        return user
+        return user_utils.get_user_info(username)
+
+    @app.before_request
+    def reject_until_db_ready() -> Optional[Tuple[str, int]]:
+        """
+        Responds with 503 until the MongoDB connection is verified.
+        Static files and the health check are always served.
+        """
+        if app.config["DB_READY"] or request.endpoint in ("static", "main.healthz"):
+            return None
+        return "Service is starting up. Please try again shortly.", 503
 
     @app.before_request
     def logout_inactive() -> None:
         """
         Logs out users who have been inactive for a specified timeout period.
         Resets the timeout if the user is still valid.
+
+        The last active time is only refreshed once it's older than `USER_ACTIVITY_REFRESH`,
+        so that the session cookie is not rewritten on every request.
         """
         if not current_user.is_authenticated:
             return
         if session.get("user_keep_alive"):
             return
         now = datetime.now(timezone.utc)
-        last_active = session.get("user_last_active", now)
-        if (now - last_active) > timedelta(seconds=USER_LOGIN_TIMEOUT):
+        last_active = session.get("user_last_active")
+        idle_secs = (now - last_active).total_seconds() if last_active is not None else 0
+        if idle_secs > USER_LOGIN_TIMEOUT:
             username = current_user.username
             logout_user()
+            user_info_cache.invalidate(username)
             session.clear()
-            logger.debug(f"User {username} logged out due to inactivity.")
-        else:
-            session["user_keep_alive"] = False
+            logger.debug("User %s logged out due to inactivity.", username)
+        elif last_active is None or idle_secs > USER_ACTIVITY_REFRESH:
             session["user_last_active"] = now
 
     @app.before_request
@@ -87,42 +178,66 @@ def create_app() -> Flask:
         """
         Logs the URL and client IP address before processing the request.
         """
-        if "static" in request.url or "debug_toolbar" in request.url:
+        if request.path.startswith(_UNLOGGED_PATH_PREFIXES):
+            return
+        if not logger.is_debug_enabled():
             return
-        client_ip = return_client_ip(request, ENV)
-        logger.debug(f"{client_ip} - {request.url} was visited.")
+        client_ip = get_client_ip(request)
+        logger.debug("%s - %s was visited.", client_ip, request.url)
 
     # Error handlers
     @app.errorhandler(404)
     def page_not_found(error) -> Tuple[str, int]:
-        client_ip = return_client_ip(request, ENV)
-        logger.debug(f"{client_ip} - 404 not found at {request.environ['RAW_URI']}. ")
+        client_ip = get_client_ip(request)
+        logger.debug("%s - 404 not found at %s. ", client_ip, request.full_path)
         return render_template("main/404.html"), 404
 
     @app.errorhandler(500)
     def internal_server_error(error) -> Tuple[str, int]:
-        client_ip = return_client_ip(request, ENV)
-        logger.error(f"{client_ip} - 500 internal error at {request.environ['RAW_URI']}.")
+        client_ip = get_client_ip(request)
+        logger.error("%s - 500 internal error at %s.", client_ip, request.full_path)
         return render_template("main/500.html"), 500
 
     logger.debug("Error handlers registered.")
 
     # Register blueprints
+    from app.views import backstage_bp, frontstage_bp, main_bp
+
     app.register_blueprint(frontstage_bp, url_prefix="/")
     app.register_blueprint(backstage_bp, url_prefix="/backstage/")
     app.register_blueprint(main_bp, url_prefix="/")
     logger.debug("Blueprints registered.")
 
-    # Check MongoDB connection
-    while True:
-        try:
-            with mongo_connection() as mongodb:
-                mongodb.client.server_info()
-                logger.debug("MongoDB connected.")
-                break
-        except ServerSelectionTimeoutError:
-            logger.error("MongoDB is NOT connected. Retry in 60 secs.")
-            time.sleep(60)
+    @app.cli.command("backfill-post-content")
+    def backfill_post_content_command() -> None:
+        """
+        Copies the post page fields from `post_info` into older `post_content` documents.
+        """
+        from app.helpers.posts import backfill_post_content
+
+        updated = backfill_post_content(mongodb)
+        logger.info("Backfilled %s post_content documents.", updated)
+
+    @app.cli.command("backfill-paging-counts")
+    def backfill_paging_counts_command() -> None:
+        """
+        Sets the users' counts of non-archived posts, projects and changelogs used for paging.
+        """
+        from app.helpers.utils import backfill_paging_counts
+
+        updated = backfill_paging_counts(mongodb)
+        logger.info("Backfilled paging counts of %s users.", updated)
+
+    # Write buffered view/read counts in the background
+    from app.helpers.counters import counter_buffer
+
+    counter_buffer.start()
+    logger.debug("Counter buffer started.")
+
+    # Check MongoDB connection in the background
+    app.config["DB_READY"] = False
+    app.config["DB_FAILED"] = False
+    threading.Thread(target=_probe_mongo, args=(app,), daemon=True).start()
 
     logger.info("App initialization completed.")
 
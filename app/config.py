@@ -16,3 +16,15 @@ RECAPTCHA_SECRET: str = os.getenv("RECAPTCHA_SECRET")  # reCAPTCHA secret key
 # Application settings
 TEMPLATE_FOLDER: pathlib.Path = (pathlib.Path(__file__).parent / "template").resolve()
 USER_LOGIN_TIMEOUT: int = 60 * 60 * 2
+USER_ACTIVITY_REFRESH: int = 60  # Min secs between refreshes of the user's last active time
+BCRYPT_ROUNDS: int = 12  # Work factor for password hashes; older hashes are upgraded at login
+MONGO_RETRY_BASE: int = 1  # Initial delay (secs) between MongoDB connection retries
+MONGO_RETRY_CAP: int = 30  # Maximum delay (secs) between MongoDB connection retries
+MONGO_RETRY_MAX_ATTEMPTS: int = 10  # Give up connecting to MongoDB after this many attempts
+COUNTER_FLUSH_INTERVAL: int = 5  # Secs between writes of buffered view/read counts to MongoDB
+VIEW_DEDUP_WINDOW: int = (
+    60 * 60 * 24
+)  # Secs during which repeat views/reads from one visitor aren't counted
+PROXY_TRUSTED_HOPS: int = (
+    1  # Reverse proxies in front of the app in prod, trusted to set X-Forwarded-For
+)
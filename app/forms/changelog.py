@@ -2,7 +2,12 @@ from flask_wtf import FlaskForm
 from wtforms import SelectField, StringField, SubmitField, TextAreaField
 from wtforms.validators import URL, InputRequired, Optional
 
-CATEGORY_CHOICES = ["Career", "Personal", "About this site", "Others"]
+CATEGORY_CHOICES = (
+    ("Career", "Career"),
+    ("Personal", "Personal"),
+    ("About this site", "About this site"),
+    ("Others", "Others"),
+)
 
 
 class NewChangelogForm(FlaskForm):
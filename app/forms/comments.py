@@ -4,6 +4,13 @@ from wtforms.validators import Email, InputRequired, Optional
 
 from app.config import RECAPTCHA_KEY
 
+# reCAPTCHA attributes of the submit button
+_SUBMIT_RENDER_KW = {
+    "data-sitekey": RECAPTCHA_KEY,
+    "data-callback": "onSubmit",
+    "class": "btn btn-primary",
+}
+
 
 class CommentForm(FlaskForm):
     """
@@ -31,11 +38,4 @@ class CommentForm(FlaskForm):
         validators=[InputRequired(message="Comment cannot be empty.")],
         render_kw={"placeholder": "Your Comment"},
     )
-    submit_ = SubmitField(
-        "Submit",
-        render_kw={
-            "data-sitekey": RECAPTCHA_KEY,
-            "data-callback": "onSubmit",
-            "class": "btn btn-primary",
-        },
-    )
+    submit_ = SubmitField("Submit", render_kw=_SUBMIT_RENDER_KW)
@@ -6,10 +6,15 @@ from wtforms.validators import URL, InputRequired, Optional, Regexp
 
 slug_pattern = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)*$")
 
+# Validators are stateless, so one instance is shared by every field that needs it
+_OPTIONAL = Optional()
+_URL_VALIDATOR = URL(message="Invalid URL.")
+_SLUG_VALIDATOR = Regexp(slug_pattern, message="Slug must be URL-friendly.")
 
-class NewPostForm(FlaskForm):
+
+class _PostForm(FlaskForm):
     """
-    Form for creating a new post. Inherits from FlaskWTForm.
+    Base form holding the fields shared by `NewPostForm` and `EditPostForm`. Inherits from FlaskWTForm.
 
     Fields:
         - title: StringField, required.
@@ -18,7 +23,6 @@ class NewPostForm(FlaskForm):
         - cover_url: StringField, optional.
         - custom_slug: StringField, optional.
         - editor: TextAreaField, required. Connected to EasyMDE.
-        - submit_: SubmitField, with a validation function defined in `/static/js/backstage/posts.js`.
     """
 
     title = StringField(validators=[InputRequired(message="Title is required.")])
@@ -29,43 +33,32 @@ class NewPostForm(FlaskForm):
     )
     cover_url = StringField(
         render_kw={"placeholder": "Insert image URL"},
-        validators=[Optional(), URL(message="Invalid URL.")],
+        validators=[_OPTIONAL, _URL_VALIDATOR],
     )
     custom_slug = StringField(
-        render_kw={"placeholder": "Must be an URL-friendly string"},
-        validators=[Optional(), Regexp(slug_pattern, message="Slug must be URL-friendly.")],
+        render_kw={"placeholder": "Must be a URL-friendly string"},
+        validators=[_OPTIONAL, _SLUG_VALIDATOR],
     )
     editor = TextAreaField()
+
+
+class NewPostForm(_PostForm):
+    """
+    Form for creating a new post. Inherits the shared post fields from `_PostForm`.
+
+    Fields:
+        - submit_: SubmitField, with a validation function defined in `/static/js/backstage/posts.js`.
+    """
+
     submit_ = SubmitField(label="Submit", render_kw={"onclick": "return validateNewPost()"})
 
 
-class EditPostForm(FlaskForm):
+class EditPostForm(_PostForm):
     """
-    Form for editing an existing post. Inherits from FlaskWTForm.
+    Form for editing an existing post. Inherits the shared post fields from `_PostForm`.
 
     Fields:
-        - title: StringField, required.
-        - subtitle: StringField, required.
-        - tags: StringField, required. Tags are separated by commas.
-        - cover_url: StringField, optional.
-        - custom_slug: StringField, optional.
-        - editor: TextAreaField, required. Connected to EasyMDE.
         - submit_: SubmitField, with a validation function defined in `/static/js/backstage/edit-post.js`.
     """
 
-    title = StringField(validators=[InputRequired(message="Title is required.")])
-    subtitle = StringField(validators=[InputRequired(message="Subtitle is required.")])
-    tags = StringField(
-        render_kw={"placeholder": "Separate tags with ','"},
-        validators=[InputRequired(message="Tags are required.")],
-    )
-    cover_url = StringField(
-        render_kw={"placeholder": "Insert image URL"},
-        validators=[Optional(), URL(message="Invalid URL.")],
-    )
-    custom_slug = StringField(
-        render_kw={"placeholder": "Must be a URL-friendly slug"},
-        validators=[Optional(), Regexp(slug_pattern, message="Slug must be URL-friendly.")],
-    )
-    editor = TextAreaField()
     submit_ = SubmitField(label="Save Changes", render_kw={"onclick": "return validateUpdate()"})
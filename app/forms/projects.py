@@ -6,20 +6,25 @@ from wtforms.validators import URL, InputRequired, Optional, Regexp
 
 slug_pattern = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)*$")
 
+# Validators are stateless, so one instance is shared by every field that needs it
+_OPTIONAL = Optional()
+_URL_VALIDATOR = URL(message="Invalid URL.")
+_SLUG_VALIDATOR = Regexp(slug_pattern, message="Slug must be URL-friendly.")
 
-class NewProjectForm(FlaskForm):
+
+class _ProjectForm(FlaskForm):
     """
-    Form for creating a new project. Inherits from FlaskWTForm.
+    Base form holding the fields shared by `NewProjectForm` and `EditProjectForm`. Inherits from FlaskWTForm.
 
     Fields:
         - title: StringField, required.
         - desc: StringField, required.
         - tags: StringField, required. Tags are separated by commas.
-        - url0, url1, url2, url3, url4: StringField, required.
+        - url0: StringField, required.
+        - url1, url2, url3, url4: StringField, optional.
         - caption0, caption1, caption2, caption3, caption4: StringField, optional.
         - custom_slug: StringField, optional.
         - editor: TextAreaField, required. Connected to EasyMDE.
-        - submit_: SubmitField, with a validation function defined in `/static/js/backstage/projects.js`.
     """
 
     title = StringField(validators=[InputRequired(message="Title is required.")])
@@ -31,80 +36,48 @@ class NewProjectForm(FlaskForm):
     url0 = StringField(
         validators=[
             InputRequired(message="At least one image URL is required."),
-            URL(message="Invalid URL."),
+            _URL_VALIDATOR,
         ],
         render_kw={"placeholder": "URL"},
     )
-    url1 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url2 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url3 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url4 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    caption0 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption1 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption2 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption3 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption4 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
+    url1 = StringField(validators=[_OPTIONAL, _URL_VALIDATOR], render_kw={"placeholder": "URL"})
+    url2 = StringField(validators=[_OPTIONAL, _URL_VALIDATOR], render_kw={"placeholder": "URL"})
+    url3 = StringField(validators=[_OPTIONAL, _URL_VALIDATOR], render_kw={"placeholder": "URL"})
+    url4 = StringField(validators=[_OPTIONAL, _URL_VALIDATOR], render_kw={"placeholder": "URL"})
+    caption0 = StringField(validators=[_OPTIONAL], render_kw={"placeholder": "Caption"})
+    caption1 = StringField(validators=[_OPTIONAL], render_kw={"placeholder": "Caption"})
+    caption2 = StringField(validators=[_OPTIONAL], render_kw={"placeholder": "Caption"})
+    caption3 = StringField(validators=[_OPTIONAL], render_kw={"placeholder": "Caption"})
+    caption4 = StringField(validators=[_OPTIONAL], render_kw={"placeholder": "Caption"})
     custom_slug = StringField(
         render_kw={"placeholder": "Must be a URL-friendly string"},
-        validators=[Optional(), Regexp(slug_pattern, message="Slug must be URL-friendly.")],
+        validators=[_OPTIONAL, _SLUG_VALIDATOR],
     )
     editor = TextAreaField()
+
+
+class NewProjectForm(_ProjectForm):
+    """
+    Form for creating a new project. Inherits the shared project fields from `_ProjectForm`.
+
+    Fields:
+        - submit_: SubmitField, with a validation function defined in `/static/js/backstage/projects.js`.
+    """
+
     submit_ = SubmitField(label="Submit", render_kw={"onclick": "return validateNewProject()"})
 
 
-class EditProjectForm(FlaskForm):
+class EditProjectForm(_ProjectForm):
     """
-    Form for editing an existing project. Inherits from FlaskWTForm.
+    Form for editing an existing project. Inherits the shared project fields from `_ProjectForm`.
 
     Fields:
-        - title: StringField, required.
-        - desc: StringField, required.
-        - tags: StringField, required. Tags are separated by commas.
-        - url0, url1, url2, url3, url4: StringField, required.
-        - caption0, caption1, caption2, caption3, caption4: StringField, optional.
-        - custom_slug: StringField, optional.
-        - editor: TextAreaField, required. Connected to EasyMDE.
+        - url0: StringField, required. Overridden to keep its own validation message.
         - submit_: SubmitField, with a validation function defined in `/static/js/backstage/edit-project.js`.
     """
 
-    title = StringField(validators=[InputRequired(message="Title is required.")])
-    desc = StringField(validators=[InputRequired(message="Description is required.")])
-    tags = StringField(
-        render_kw={"placeholder": "Separate tags with ','"},
-        validators=[InputRequired(message="Tags are required.")],
-    )
     url0 = StringField(
-        validators=[InputRequired(message="URL is required."), URL(message="Invalid URL.")],
+        validators=[InputRequired(message="URL is required."), _URL_VALIDATOR],
         render_kw={"placeholder": "URL"},
     )
-    url1 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url2 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url3 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    url4 = StringField(
-        validators=[Optional(), URL(message="Invalid URL.")], render_kw={"placeholder": "URL"}
-    )
-    caption0 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption1 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption2 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption3 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    caption4 = StringField(validators=[Optional()], render_kw={"placeholder": "Caption"})
-    custom_slug = StringField(
-        render_kw={"placeholder": "Must be a URL-friendly string"},
-        validators=[Optional(), Regexp(slug_pattern, message="Slug must be URL-friendly.")],
-    )
-    editor = TextAreaField()
     submit_ = SubmitField(label="Submit", render_kw={"onclick": "return validateUpdate()"})
@@ -1,12 +1,43 @@
-from dataclasses import asdict
 from datetime import datetime, timezone
+from typing import Optional
 
 from flask_login import current_user
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 from app.forms.changelog import EditChangelogForm, NewChangelogForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.users import user_info_cache
+from app.helpers.utils import (
+    PAGING_COUNT_FIELDS,
+    UIDGenerator,
+    process_tags,
+    shallow_asdict,
+    uid_generator,
+)
 from app.models.changelog import Changelog
-from app.mongo import Database
+from app.mongo import CHANGELOG_LIST_INDEX, Database
+
+# Fields needed to render changelogs as a list, leaving out the content
+CHANGELOG_LIST_PROJECTION = {
+    "changelog_uid": 1,
+    "title": 1,
+    "date": 1,
+    "tags": 1,
+    "category": 1,
+    "created_at": 1,
+    "last_updated": 1,
+    "archived": 1,
+}
+
+
+def _parse_changelog_date(date_string: str) -> datetime:
+    """
+    Parse the `mm/dd/yyyy` string from the changelog date picker into a UTC datetime.
+
+    The format is fixed, so splitting it directly is much cheaper than `datetime.strptime()`.
+    """
+    month, day, year = date_string.split("/")
+    return datetime(int(year), int(month), int(day), tzinfo=timezone.utc)
 
 
 class NewChangelogSetup:
@@ -17,6 +48,7 @@ class NewChangelogSetup:
     """
 
     def __init__(self, changelog_uid_generator: UIDGenerator, db_handler: Database) -> None:
+        self._changelog_uid_generator = changelog_uid_generator
         self._changelog_uid = changelog_uid_generator.generate_changelog_uid()
         self._db_handler = db_handler
 
@@ -25,25 +57,46 @@ class NewChangelogSetup:
             changelog_uid=self._changelog_uid,
             title=form.title.data,
             author=author_name,
-            date=datetime.strptime(form.date.data, "%m/%d/%Y").replace(tzinfo=timezone.utc),
+            date=_parse_changelog_date(form.date.data),
             category=form.category.data,
             content=form.editor.data,
             tags=process_tags(form.tags.data),
             link=form.link.data,
             link_description=form.link_description.data,
         )
-        return asdict(new_changelog)
+        return shallow_asdict(new_changelog)
 
     def create_changelog(self, form: NewChangelogForm, author_name: str) -> str:
         """
-        Creates and inserts a new changelog entry into the database.
+        Creates and inserts a new changelog entry into the database,
+        in a single bulk write along with the user's changelog count.
+        The write is retried with a new UID if the UID is taken.
 
         Returns:
             str: The UID of the newly created changelog.
         """
-        new_changelog_entry = self._create_changelog(form, author_name)
-        self._db_handler.changelog.insert_one(new_changelog_entry)
-        return self._changelog_uid
+        changelog = self._db_handler.changelog
+        user_info = self._db_handler.user_info
+        while True:
+            new_changelog_entry = self._create_changelog(form, author_name)
+            try:
+                self._db_handler.bulk_write(
+                    [
+                        (changelog, InsertOne(new_changelog_entry, namespace=changelog.namespace)),
+                        (
+                            user_info,
+                            UpdateOne(
+                                {"username": author_name},
+                                {"$inc": {PAGING_COUNT_FIELDS["changelog"]: 1}},
+                                namespace=user_info.namespace,
+                            ),
+                        ),
+                    ]
+                )
+                user_info_cache.invalidate(author_name)
+                return self._changelog_uid
+            except DuplicateKeyError:
+                self._changelog_uid = self._changelog_uid_generator.generate_changelog_uid()
 
 
 def create_changelog(form: NewChangelogForm, db_handler: Database) -> str:
@@ -53,7 +106,6 @@ def create_changelog(form: NewChangelogForm, db_handler: Database) -> str:
     Returns:
         str: The UID of the newly created changelog.
     """
-    uid_generator = UIDGenerator(db_handler=db_handler)
     new_changelog_setup = NewChangelogSetup(
         changelog_uid_generator=uid_generator, db_handler=db_handler
     )
@@ -79,7 +131,7 @@ class ChangelogUpdateSetup:
         """
         updated_changelog = {
             "title": form.title.data,
-            "date": datetime.strptime(form.date.data, "%m/%d/%Y").replace(tzinfo=timezone.utc),
+            "date": _parse_changelog_date(form.date.data),
             "category": form.category.data,
             "content": form.editor.data,
             "tags": process_tags(form.tags.data),
@@ -110,70 +162,89 @@ class ChangelogUtils:
     def __init__(self, db_handler: Database) -> None:
         self._db_handler = db_handler
 
-    def get_changelogs(self, username: str, by_date: bool = False) -> list[dict]:
+    def get_changelogs(
+        self, username: str, by_date: bool = False, projection: Optional[dict] = None
+    ) -> list[dict]:
         """
         Retrieves all non-archived changelog entries for the given user.
 
         Entries are sorted either by `date` or `created_at` field. Default is `created_at`.
 
+        Pass `projection` (e.g. `CHANGELOG_LIST_PROJECTION`) to fetch only the fields needed.
+
         Returns:
             list[dict]: A list of dictionaries representing `changelog`.
         """
+        cursor = self._db_handler.changelog.find(
+            {"author": username, "archived": False}, projection
+        )
         if by_date:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("date", -1)
-                .as_list()
-            )
+            result = cursor.sort("date", -1).as_list()
         else:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .as_list()
-            )
+            result = cursor.sort("created_at", -1).hint(CHANGELOG_LIST_INDEX).as_list()
         return result
 
-    def get_archived_changelogs(self, username: str) -> list[dict]:
+    def get_archived_changelogs(
+        self, username: str, projection: Optional[dict] = None
+    ) -> list[dict]:
         """
         Retrieves all archived changelog entries for the given user.
 
         Entries are sorted by `created_at` timestamps.
 
+        Pass `projection` (e.g. `CHANGELOG_LIST_PROJECTION`) to fetch only the fields needed.
+
         Returns:
             list[dict]: A list of dictionaries representing `changelog`.
         """
         result = (
-            self._db_handler.changelog.find({"author": username, "archived": True})
+            self._db_handler.changelog.find({"author": username, "archived": True}, projection)
             .sort("created_at", -1)
+            .hint(CHANGELOG_LIST_INDEX)
             .as_list()
         )
         return result
 
     def get_changelogs_with_pagination(
-        self, username: str, page_number: int, changelogs_per_page: int
+        self,
+        username: str,
+        page_number: int,
+        changelogs_per_page: int,
+        after: Optional[tuple[datetime, str]] = None,
+        projection: Optional[dict] = None,
     ) -> list[dict]:
         """
         Retrieves all non-archived changelog entries for the given user with pagination.
         The page number and the number of changelogs per page are therefore required.
 
-        Entries are sorted by `created_at` timestamps.
+        If `after` is given, it should be the `created_at` and `changelog_uid` of the last entry on the previous page.
+        The entries are then fetched by seeking past that entry instead of skipping all the previous pages,
+        so deep pages are as cheap as the first one.
+
+        Entries are sorted by `created_at` timestamps, with `changelog_uid` breaking ties.
+
+        Pass `projection` (e.g. `CHANGELOG_LIST_PROJECTION`) to fetch only the fields needed.
 
         Returns:
             list[dict]: A list of dictionaries representing `changelog`.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(changelogs_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * changelogs_per_page)
-                .limit(changelogs_per_page)
-                .as_list()
-            )
+        filter = {"author": username, "archived": False}
+        if after is not None:
+            after_created_at, after_uid = after
+            filter["$or"] = [
+                {"created_at": {"$lt": after_created_at}},
+                {"created_at": after_created_at, "changelog_uid": {"$lt": after_uid}},
+            ]
+            skip = 0
+        else:
+            skip = max(page_number - 1, 0) * changelogs_per_page
+
+        result = (
+            self._db_handler.changelog.find(filter, projection)
+            .sort([("created_at", -1), ("changelog_uid", -1)])
+            .hint(CHANGELOG_LIST_INDEX)
+            .skip(skip)
+            .limit(changelogs_per_page)
+            .as_list()
+        )
         return result
@@ -1,15 +1,28 @@
-from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from flask import Request, request
+from flask import request
 from flask_login import current_user
+from pymongo.errors import DuplicateKeyError
+from requests.adapters import HTTPAdapter
 
 from app.config import RECAPTCHA_SECRET
 from app.forms.comments import CommentForm
-from app.helpers.utils import UIDGenerator
+from app.helpers.utils import UIDGenerator, shallow_asdict, uid_generator
+from app.logging import logger
 from app.models.comments import AnonymousComment, RegisteredComment
 from app.mongo import Database
 
+RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
+RECAPTCHA_TIMEOUT = (2, 3)  # (connect, read) secs
+
+# Shared session so that the connection to Google is kept alive and reused across comments
+_recaptcha_session = requests.Session()
+_recaptcha_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# Runs the verification requests, so that the comment is built while waiting for Google
+_recaptcha_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="recaptcha")
+
 
 class NewCommentSetup:
     """
@@ -22,51 +35,79 @@ class NewCommentSetup:
 
     def __init__(self, comment_uid_generator: UIDGenerator, db_handler: Database) -> None:
         self._db_handler = db_handler
+        self._comment_uid_generator = comment_uid_generator
         self._comment_uid = comment_uid_generator.generate_comment_uid()
 
     @staticmethod
-    def _recaptcha_verified(request: Request) -> bool:
+    def _recaptcha_verified(token: str) -> bool:
         """
-        Verifies the Recaptcha response to ensure it's valid.
+        Verifies the Recaptcha response token from the form to ensure it's valid.
+        The verification fails if Google cannot be reached within `RECAPTCHA_TIMEOUT`, or doesn't answer with JSON.
+
+        It runs in `_recaptcha_executor`, so it must not touch the request context.
 
         Returns:
             bool: True if Recaptcha verification is successful, otherwise False.
         """
-        token = request.form.get("g-recaptcha-response")
         payload = {"secret": RECAPTCHA_SECRET, "response": token}
-        resp = requests.post("https://www.google.com/recaptcha/api/siteverify", params=payload)
-        resp = resp.json()
+        try:
+            resp = _recaptcha_session.post(
+                RECAPTCHA_VERIFY_URL, data=payload, timeout=RECAPTCHA_TIMEOUT
+            )
+            resp = resp.json()
+        except ValueError as e:
+            # checked first, as requests' JSON decoding error is also a `RequestException`
+            logger.error("Recaptcha verification returned an invalid response: %s", e)
+            return False
+        except requests.RequestException as e:
+            logger.error("Recaptcha verification request failed: %s", e)
+            return False
         return resp.get("success", False)
 
-    def create_comment(self, post_uid: str, form: CommentForm) -> str:
-        """
-        Creates and insert a new comment associating to the given post into the database.
-
-        Returns the UID of the newly created comment.
-        """
-        if not self._recaptcha_verified(request):
-            return
-
+    def _create_comment(self, post_uid: str, form: CommentForm) -> dict:
+        # `form.data` builds a new dict on every access, so it's read once
+        form_data = form.data
         if current_user.is_authenticated:
             new_comment = RegisteredComment(
                 name=current_user.username,
                 email=current_user.email,
                 post_uid=post_uid,
                 comment_uid=self._comment_uid,
-                comment=form.data.get("comment"),
+                comment=form_data["comment"],
             )
         else:
             new_comment = AnonymousComment(
-                name=f'{form.data.get("name")} (Visitor)',
-                email=form.data.get("email"),
+                name=f'{form_data["name"]} (Visitor)',
+                email=form_data["email"],
                 post_uid=post_uid,
                 comment_uid=self._comment_uid,
-                comment=form.data.get("comment"),
+                comment=form_data["comment"],
             )
+        return shallow_asdict(new_comment)
 
-        new_comment_data = asdict(new_comment)
-        self._db_handler.comment.insert_one(new_comment_data)
-        return self._comment_uid
+    def create_comment(self, post_uid: str, form: CommentForm) -> str:
+        """
+        Creates and insert a new comment associating to the given post into the database.
+        The Recaptcha verification runs in the background while the comment is being built,
+        and the comment is inserted only once it succeeds.
+        The insert is retried with a new UID if the UID is taken.
+
+        Returns the UID of the newly created comment.
+        """
+        verification = _recaptcha_executor.submit(
+            self._recaptcha_verified, request.form.get("g-recaptcha-response")
+        )
+        new_comment_data = self._create_comment(post_uid, form)
+        if not verification.result():
+            return
+
+        while True:
+            try:
+                self._db_handler.comment.insert_one(new_comment_data)
+                return self._comment_uid
+            except DuplicateKeyError:
+                self._comment_uid = self._comment_uid_generator.generate_comment_uid()
+                new_comment_data["comment_uid"] = self._comment_uid
 
 
 def create_comment(post_uid: str, form: CommentForm, db_handler: Database) -> str:
@@ -75,7 +116,6 @@ def create_comment(post_uid: str, form: CommentForm, db_handler: Database) -> st
 
     Returns the UID of the newly created comment.
     """
-    uid_generator = UIDGenerator(db_handler=db_handler)
     comment_setup = NewCommentSetup(comment_uid_generator=uid_generator, db_handler=db_handler)
     new_comment_uid = comment_setup.create_comment(post_uid=post_uid, form=form)
     return new_comment_uid
@@ -100,3 +140,22 @@ class CommentUtils:
             self._db_handler.comment.find({"post_uid": post_uid}).sort("created_at", 1).as_list()
         )
         return result
+
+    def count_comments_by_post_uids(self, post_uids: list[str]) -> dict[str, int]:
+        """
+        Counts the comments under each of the given posts in a single aggregation,
+        instead of one `count_documents()` per post. Served by `COMMENT_LIST_INDEX`.
+
+        Returns:
+            dict[str, int]: The number of comments by post UID. Posts without comments are not included.
+        """
+        if not post_uids:
+            return {}
+        pipeline = [
+            {"$match": {"post_uid": {"$in": post_uids}}},
+            {"$group": {"_id": "$post_uid", "count": {"$sum": 1}}},
+        ]
+        return {
+            result["_id"]: result["count"]
+            for result in self._db_handler.comment.aggregate(pipeline)
+        }
@@ -0,0 +1,157 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config import COUNTER_FLUSH_INTERVAL, VIEW_DEDUP_WINDOW
+from app.helpers.utils import TTLCache
+from app.logging import logger
+from app.mongo import Database, mongodb
+
+
+class CounterBuffer:
+    """
+    Buffers counter increments, e.g. views and reads, in memory and writes them to the database in batches.
+
+    Use `increment()` on the request path, which only touches memory.
+    The pending increments are written by `flush()`, which runs periodically in the thread started by `start()`.
+    Each collection is flushed with a single bulk write, holding one `$inc` per document.
+
+    Since increments are additive, each worker process can flush its own buffer without coordination.
+    Increments that fail to be written because of a connection error are kept for the next flush,
+    while the ones rejected by the server for a document are logged and dropped.
+    Note that the increments not flushed yet are lost if the process is killed.
+
+    If a visitor is given, repeated increments of the same counter by the same visitor within `dedup_window` secs
+    are dropped in memory. This is kept per worker process, so a visitor may still be counted once per worker.
+    """
+
+    def __init__(self, db_handler: Database, flush_interval: int, dedup_window: int) -> None:
+        self._db_handler = db_handler
+        self._flush_interval = flush_interval
+        self._seen = TTLCache(maxsize=20000, ttl=dedup_window)
+        self._pending: defaultdict[tuple[str, str, str], defaultdict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def increment(
+        self,
+        collection: str,
+        key_field: str,
+        key: str,
+        counter: str,
+        visitor: Optional[str] = None,
+    ) -> None:
+        """
+        Increases `counter` by 1 for the document whose `key_field` equals `key`.
+        `collection` is the name of the collection property on `Database`, e.g. "post_info".
+
+        Pass `visitor` (e.g. the client IP) to count the visitor only once within the dedup window.
+
+        No return value.
+        """
+        if visitor is not None:
+            seen_key = (collection, key, counter, visitor)
+            if self._seen.get(seen_key):
+                return
+            self._seen.set(seen_key, True)
+        with self._lock:
+            self._pending[(collection, key_field, key)][counter] += 1
+
+    def flush(self) -> None:
+        """
+        Writes all the pending increments to the database. No return value.
+
+        Each collection is written with an unordered bulk write, so one failing document doesn't hold back the others.
+        Increments rejected by the server for a document (e.g. the counter is not a number) will never succeed,
+        so they are logged and dropped.
+        If the write fails as a whole (e.g. the connection drops), the increments of that collection and the ones
+        not tried yet are put back into the buffer before the error is raised, so the next flush retries them.
+        The server may have applied some of them, which are then counted twice; this is preferred over losing them.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(lambda: defaultdict(int))
+        if not pending:
+            return
+
+        by_collection = defaultdict(list)
+        for (collection, key_field, key), counters in pending.items():
+            by_collection[collection].append(((collection, key_field, key), counters))
+        collections = list(by_collection)
+        for i, collection in enumerate(collections):
+            entries = by_collection[collection]
+            requests = [
+                UpdateOne({key_field: key}, {"$inc": dict(counters)})
+                for (_, key_field, key), counters in entries
+            ]
+            try:
+                getattr(self._db_handler, collection).bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                # the writes not listed in writeErrors were applied, even if the write concern failed
+                for error in e.details.get("writeErrors", []):
+                    target, counters = entries[error["index"]]
+                    logger.error(
+                        "Dropped counter increments %s for %s: %s",
+                        dict(counters),
+                        target,
+                        error.get("errmsg"),
+                    )
+                for error in e.details.get("writeConcernErrors", []):
+                    logger.error("Counter flush write concern error: %s", error.get("errmsg"))
+            except PyMongoError:
+                self._requeue(entries)
+                self._requeue_collections(by_collection, collections[i + 1 :])
+                raise
+
+    def _requeue(self, entries: list[tuple[tuple[str, str, str], dict[str, int]]]) -> None:
+        """
+        Adds undelivered increments back to the pending ones, merging them with the increments made since.
+        """
+        with self._lock:
+            for target, counters in entries:
+                for counter, delta in counters.items():
+                    self._pending[target][counter] += delta
+
+    def _requeue_collections(self, by_collection: dict, collections: list[str]) -> None:
+        for collection in collections:
+            self._requeue(by_collection[collection])
+
+    def start(self) -> None:
+        """
+        Starts the background thread flushing the counters every `flush_interval` seconds.
+        The remaining increments are also flushed when the process exits.
+
+        No return value.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._thread.start()
+        atexit.register(self._try_flush)
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(self._flush_interval)
+            self._try_flush()
+
+    def _try_flush(self) -> None:
+        # anything is caught, so that one bad flush can't stop the flushing thread
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Failed to flush counters: %s", e)
+
+
+# The counters are flushed with `w=1`, as they don't need to wait for replication
+counter_buffer = CounterBuffer(
+    db_handler=mongodb.with_write_concern(w=1),
+    flush_interval=COUNTER_FLUSH_INTERVAL,
+    dedup_window=VIEW_DEDUP_WINDOW,
+)
@@ -1,12 +1,54 @@
-from dataclasses import asdict
 from datetime import datetime, timezone
+from typing import Optional
 
+from flask import g, request
 from flask_login import current_user
+from pymongo import InsertOne, UpdateOne
+from pymongo.command_cursor import CommandCursor
+from pymongo.errors import DuplicateKeyError
 
 from app.forms.posts import EditPostForm, NewPostForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.counters import counter_buffer
+from app.helpers.users import user_info_cache
+from app.helpers.utils import (
+    PAGING_COUNT_FIELDS,
+    UIDGenerator,
+    get_visitor_id,
+    is_viewed_by_author,
+    process_tags,
+    shallow_asdict,
+    uid_generator,
+)
 from app.models.posts import PostContent, PostInfo
-from app.mongo import Database
+from app.mongo import POST_LIST_INDEX, Database
+
+# Fields needed to render posts as a list of summaries, e.g. on the tag page
+POST_SUMMARY_PROJECTION = {
+    "post_uid": 1,
+    "title": 1,
+    "subtitle": 1,
+    "tags": 1,
+    "created_at": 1,
+}
+
+# Fields written to the data export, with `content` joined from `post_content`
+POST_EXPORT_PROJECTION = {
+    "_id": 0,
+    "post_uid": 1,
+    "title": 1,
+    "subtitle": 1,
+    "author": 1,
+    "content": 1,
+    "tags": 1,
+    "cover_url": 1,
+    "custom_slug": 1,
+    "created_at": 1,
+    "last_updated": 1,
+    "archived": 1,
+    "featured": 1,
+    "views": 1,
+    "reads": 1,
+}
 
 
 class NewPostSetup:
@@ -19,6 +61,7 @@ class NewPostSetup:
     """
 
     def __init__(self, post_uid_generator: UIDGenerator, db_handler: Database) -> None:
+        self._post_uid_generator = post_uid_generator
         self._post_uid = post_uid_generator.generate_post_uid()
         self._db_handler = db_handler
 
@@ -32,20 +75,32 @@ class NewPostSetup:
             custom_slug=form.custom_slug.data,
             cover_url=form.cover_url.data,
         )
-        return asdict(new_post_info)
+        return shallow_asdict(new_post_info)
 
-    def _create_post_content(self, form: NewPostForm, author_name: str) -> dict:
+    def _create_post_content(self, form: NewPostForm, new_post_info: dict) -> dict:
         new_post_content = PostContent(
-            post_uid=self._post_uid, author=author_name, content=form.editor.data
+            post_uid=self._post_uid,
+            author=new_post_info.get("author"),
+            content=form.editor.data,
+            title=new_post_info.get("title"),
+            subtitle=new_post_info.get("subtitle"),
+            tags=new_post_info.get("tags"),
+            cover_url=new_post_info.get("cover_url"),
+            custom_slug=new_post_info.get("custom_slug"),
+            created_at=new_post_info.get("created_at"),
+            last_updated=new_post_info.get("last_updated"),
         )
-        return asdict(new_post_content)
+        return shallow_asdict(new_post_content)
 
-    def _increment_tags_for_user(self, new_post_info: dict) -> None:
+    def _build_user_info_increment(self, new_post_info: dict) -> UpdateOne:
         username = new_post_info.get("author")
-        tags = new_post_info.get("tags")
-        tags_increments = {f"tags.{tag}": 1 for tag in tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_increments, upsert=True
+        increments = {f"tags.{tag}": 1 for tag in new_post_info.get("tags")}
+        increments[PAGING_COUNT_FIELDS["post"]] = 1
+        return UpdateOne(
+            {"username": username},
+            {"$inc": increments},
+            upsert=True,
+            namespace=self._db_handler.user_info.namespace,
         )
 
     def create_post(self, author_name: str, form: NewPostForm) -> str:
@@ -54,17 +109,31 @@ class NewPostSetup:
         organizes them into `post_info` and `post_content` dataclasses, converts them to dictionaries,
         finally inserts them into the database.
 
-        User's tag counts are also incremented when a new post is created.
+        User's tag counts and post count are also incremented when a new post is created.
+        All the writes are sent in a single bulk write, which is retried with a new UID if the UID is taken.
 
         Returns:
             str: The UID of the newly created post.
         """
-        new_post_info = self._create_post_info(form=form, author_name=author_name)
-        new_post_content = self._create_post_content(form=form, author_name=author_name)
-
-        self._db_handler.post_info.insert_one(new_post_info)
-        self._db_handler.post_content.insert_one(new_post_content)
-        self._increment_tags_for_user(new_post_info)
+        post_info = self._db_handler.post_info
+        post_content = self._db_handler.post_content
+        while True:
+            new_post_info = self._create_post_info(form=form, author_name=author_name)
+            new_post_content = self._create_post_content(form=form, new_post_info=new_post_info)
+            writes = [
+                (post_info, InsertOne(new_post_info, namespace=post_info.namespace)),
+                (post_content, InsertOne(new_post_content, namespace=post_content.namespace)),
+            ]
+            writes.append(
+                (self._db_handler.user_info, self._build_user_info_increment(new_post_info))
+            )
+            try:
+                self._db_handler.bulk_write(writes)
+                user_info_cache.invalidate(author_name)
+                break
+            except DuplicateKeyError:
+                # the `post_info` insert comes first, so nothing was written
+                self._post_uid = self._post_uid_generator.generate_post_uid()
 
         return self._post_uid
 
@@ -80,7 +149,6 @@ def create_post(form: NewPostForm, db_handler: Database) -> str:
     Returns:
         str: The UID of the newly created post.
     """
-    uid_generator = UIDGenerator(db_handler=db_handler)
     new_post_setup = NewPostSetup(post_uid_generator=uid_generator, db_handler=db_handler)
     new_post_uid = new_post_setup.create_post(author_name=current_user.username, form=form)
     return new_post_uid
@@ -98,18 +166,22 @@ class PostUpdateSetup:
     def __init__(self, db_handler: Database) -> None:
         self._db_handler = db_handler
 
-    def _update_tags_for_user(self, post_uid: str, new_tags: dict) -> None:
-        post_info = self._db_handler.post_info.find_one({"post_uid": post_uid})
-        username = post_info.get("author")
-        old_tags = post_info.get("tags")
-
-        tags_reduction = {f"tags.{tag}": -1 for tag in old_tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_reduction
-        )
-        tags_increment = {f"tags.{tag}": 1 for tag in new_tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_increment, upsert=True
+    def _build_tags_deltas(
+        self, username: str, old_tags: list[str], new_tags: list[str]
+    ) -> Optional[UpdateOne]:
+        old_tags = set(old_tags)
+        new_tags = set(new_tags)
+
+        # only the tags being removed or added need to change, unchanged tags are skipped
+        tags_deltas = {f"tags.{tag}": -1 for tag in old_tags - new_tags}
+        tags_deltas.update({f"tags.{tag}": 1 for tag in new_tags - old_tags})
+        if not tags_deltas:
+            return None
+        return UpdateOne(
+            {"username": username},
+            {"$inc": tags_deltas},
+            upsert=True,
+            namespace=self._db_handler.user_info.namespace,
         )
 
     def update_post(self, post_uid: str, form: EditPostForm) -> None:
@@ -117,9 +189,13 @@ class PostUpdateSetup:
         Update an existing post in the database. No return value.
 
         User's tag counts are also updated when a post is updated.
+        `post_info` is updated first, returning the old author and tags in the same operation.
+        The `post_content` copy of its fields and the tag count updates are then sent in a single bulk write.
 
         No return value.
         """
+        post_info = self._db_handler.post_info
+        post_content = self._db_handler.post_content
         updated_post_info = {
             "title": form.title.data,
             "subtitle": form.subtitle.data,
@@ -128,15 +204,39 @@ class PostUpdateSetup:
             "custom_slug": form.custom_slug.data,
             "last_updated": datetime.now(timezone.utc),
         }
-        updated_post_content = {"content": form.editor.data}
-
-        self._update_tags_for_user(post_uid, updated_post_info.get("tags"))
-        self._db_handler.post_info.update_values(
-            filter={"post_uid": post_uid}, update=updated_post_info
+        # `post_content` keeps a copy of the `post_info` fields rendered on the post page
+        updated_post_content = {**updated_post_info, "content": form.editor.data}
+
+        # the old author and tags come back from the same operation that updates the post,
+        # so concurrent edits can't both apply their tag deltas against the same old tags
+        old_post_info = post_info.find_and_update_values(
+            filter={"post_uid": post_uid},
+            update=updated_post_info,
+            projection={"author": 1, "tags": 1, "created_at": 1, "_id": 0},
         )
-        self._db_handler.post_content.update_values(
-            filter={"post_uid": post_uid}, update=updated_post_content
+        author = old_post_info.get("author")
+        # `created_at` is copied as well, since posts created before the copy existed don't have it yet
+        updated_post_content["created_at"] = old_post_info.get("created_at")
+        writes = [
+            (
+                post_content,
+                UpdateOne(
+                    {"post_uid": post_uid},
+                    {"$set": updated_post_content},
+                    namespace=post_content.namespace,
+                ),
+            ),
+        ]
+        tags_deltas = self._build_tags_deltas(
+            author, old_post_info.get("tags"), updated_post_info.get("tags")
         )
+        if tags_deltas is not None:
+            writes.append((self._db_handler.user_info, tags_deltas))
+        self._db_handler.bulk_write(writes)
+
+        if tags_deltas is not None:
+            user_info_cache.invalidate(author)
+        g.get("_post_cache", {}).pop(post_uid, None)
 
 
 def update_post(post_uid: str, form: EditPostForm, db_handler: Database) -> None:
@@ -151,6 +251,49 @@ def update_post(post_uid: str, form: EditPostForm, db_handler: Database) -> None
     post_update_setup.update_post(post_uid=post_uid, form=form)
 
 
+def backfill_post_content(db_handler: Database) -> int:
+    """
+    Copies the `post_info` fields rendered on the post page into the `post_content` documents that lack them,
+    i.e. posts created before `post_content` kept that copy. Those posts are read with a `$lookup` until then.
+
+    This is a one-off migration, run with `flask --app run backfill-post-content`.
+
+    Returns:
+        int: The number of `post_content` documents updated.
+    """
+    copied_fields = (
+        "title",
+        "subtitle",
+        "tags",
+        "cover_url",
+        "custom_slug",
+        "created_at",
+        "last_updated",
+    )
+    missing = db_handler.post_content.find_raw(
+        {"created_at": {"$exists": False}}, {"post_uid": 1, "_id": 0}
+    )
+    post_uids = [doc["post_uid"] for doc in missing]
+
+    updated = 0
+    for start in range(0, len(post_uids), 1000):
+        batch = post_uids[start : start + 1000]
+        infos = db_handler.post_info.find_raw(
+            {"post_uid": {"$in": batch}}, dict.fromkeys(("post_uid", *copied_fields), 1)
+        )
+        requests = [
+            UpdateOne(
+                {"post_uid": info["post_uid"]},
+                {"$set": {field: info.get(field) for field in copied_fields}},
+            )
+            for info in infos
+        ]
+        if requests:
+            db_handler.post_content.bulk_write(requests)
+            updated += len(requests)
+    return updated
+
+
 class PostUtils:
     """
     Provides utility methods for handling posts.
@@ -159,35 +302,67 @@ class PostUtils:
     def __init__(self, db_handler: Database) -> None:
         self._db_handler = db_handler
 
-    def get_all_posts_info(self, include_archive=False) -> list[dict]:
+    def iter_sitemap_entries(self) -> CommandCursor:
         """
-        Retrieves all `post_info` documents from all users.
-
-        This is mostly used to generate the sitemap.
+        Iterates over the sitemap entries of all non-archived posts and projects, in a single aggregation.
+        Projects are appended to the posts with `$unionWith`, and the results are fetched in batches.
 
-        Archived posts are excluded by default, but can be included if needed.
+        Each entry has the fields `type` ("post" or "project"), `author`, `uid`, `slug` and `last_updated`.
 
         Returns:
-            list[dict]: A list of dictionaries representing `post_info`.
+            CommandCursor: A cursor yielding the sitemap entries.
         """
-        if include_archive:
-            result = self._db_handler.post_info.find({}).as_list()
-        else:
-            result = self._db_handler.post_info.find({"archived": False}).as_list()
-        return result
+        return self._db_handler.post_info.iter_aggregate(
+            [
+                {"$match": {"archived": False}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "type": {"$literal": "post"},
+                        "author": 1,
+                        "uid": "$post_uid",
+                        "slug": "$custom_slug",
+                        "last_updated": 1,
+                    }
+                },
+                {
+                    "$unionWith": {
+                        "coll": self._db_handler.project_info.name,
+                        "pipeline": [
+                            {"$match": {"archived": False}},
+                            {
+                                "$project": {
+                                    "_id": 0,
+                                    "type": {"$literal": "project"},
+                                    "author": 1,
+                                    "uid": "$project_uid",
+                                    "slug": "$custom_slug",
+                                    "last_updated": 1,
+                                }
+                            },
+                        ],
+                    }
+                },
+            ],
+            batch_size=500,
+        )
 
-    def get_featured_posts_info(self, username: str) -> list[dict]:
+    def get_featured_posts_info(
+        self, username: str, projection: Optional[dict] = None
+    ) -> list[dict]:
         """
         Retrieves all featured posts' `post_info` documents for the given user.
 
         Note that archived posts are excluded.
 
+        Pass `projection` to fetch only the fields needed.
+
         Returns:
             list[dict]: A list of dictionaries representing `post_info`.
         """
         result = (
             self._db_handler.post_info.find(
-                {"author": username, "featured": True, "archived": False}
+                {"author": username, "featured": True, "archived": False}, projection
             )
             .sort("created_at", -1)
             .limit(10)
@@ -195,7 +370,9 @@ class PostUtils:
         )
         return result
 
-    def get_post_infos(self, username: str, archive="exclude") -> list[dict]:
+    def get_post_infos(
+        self, username: str, archive="exclude", projection: Optional[dict] = None
+    ) -> list[dict]:
         """
         Retrieves all posts' `post_info` documents for the given user.
 
@@ -203,94 +380,179 @@ class PostUtils:
 
         Possible values for `archive`: "exclude", "include", "only".
 
+        Pass `projection` to fetch only the fields needed.
+        Unless archived ones are included, the query is served by `POST_LIST_INDEX` in sorted order.
+
         Returns:
             list[dict]: A list of dictionaries representing `post_info`.
         """
         if archive == "exclude":
             result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
+                self._db_handler.post_info.find({"author": username, "archived": False}, projection)
                 .sort("created_at", -1)
+                .hint(POST_LIST_INDEX)
                 .as_list()
             )
         elif archive == "include":
             result = (
-                self._db_handler.post_info.find({"author": username})
+                self._db_handler.post_info.find({"author": username}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "only":
             result = (
-                self._db_handler.post_info.find({"author": username, "archived": True})
+                self._db_handler.post_info.find({"author": username, "archived": True}, projection)
                 .sort("created_at", -1)
+                .hint(POST_LIST_INDEX)
                 .as_list()
             )
         return result
 
+    def iter_post_infos_with_content(
+        self, username: str, projection: Optional[dict] = None
+    ) -> CommandCursor:
+        """
+        Iterates over all `post_info` documents of the given user, archived ones included,
+        each joined with the `content` field of its `post_content` document.
+
+        The join is done by the database with `$lookup`, and the documents are streamed in batches,
+        so this is preferred over fetching the contents one by one, e.g. for exporting.
+
+        Pass `projection` to return only the fields needed; it is applied last, after the join.
+
+        Returns:
+            CommandCursor: A cursor yielding dictionaries representing `post_info`, plus `content`.
+        """
+        pipeline = [
+            {"$match": {"author": username}},
+            {"$sort": {"created_at": -1}},
+            {
+                "$lookup": {
+                    "from": self._db_handler.post_content.name,
+                    "localField": "post_uid",
+                    "foreignField": "post_uid",
+                    "as": "content",
+                }
+            },
+            {"$set": {"content": {"$arrayElemAt": ["$content.content", 0]}}},
+        ]
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        return self._db_handler.post_info.iter_aggregate(pipeline, batch_size=100)
+
     def get_post_infos_with_pagination(
-        self, username: str, page_number: int, posts_per_page: int
+        self,
+        username: str,
+        page_number: int,
+        posts_per_page: int,
+        after: Optional[tuple[datetime, str]] = None,
     ) -> list[dict]:
         """
         Retrieves all posts' `post_info` documents for the given user with pagination.
         The page number and the number of posts per page are therefore required.
 
+        If `after` is given, it should be the `created_at` and `post_uid` of the last post on the previous page.
+        The posts are then fetched by seeking past that post instead of skipping all the previous pages,
+        so deep pages are as cheap as the first one.
+
+        Posts are sorted by `created_at` timestamps, with `post_uid` breaking ties.
+
         Note that archived posts are excluded.
 
         Returns:
             list[dict]: A list of dictionaries representing `post_info`.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(posts_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * posts_per_page)
-                .limit(posts_per_page)
-                .as_list()
-            )
+        filter = {"author": username, "archived": False}
+        if after is not None:
+            after_created_at, after_uid = after
+            filter["$or"] = [
+                {"created_at": {"$lt": after_created_at}},
+                {"created_at": after_created_at, "post_uid": {"$lt": after_uid}},
+            ]
+            skip = 0
+        else:
+            skip = max(page_number - 1, 0) * posts_per_page
+
+        result = (
+            self._db_handler.post_info.find(filter)
+            .sort([("created_at", -1), ("post_uid", -1)])
+            .hint(POST_LIST_INDEX)
+            .skip(skip)
+            .limit(posts_per_page)
+            .as_list()
+        )
         return result
 
     def get_full_post(self, post_uid: str) -> dict:
         """
         Retrieves the full post data for a specific post UID.
-        `post_info` and `post_content` are merged into one dictionary by `post_uid`.
+        `post_content` holds a copy of the `post_info` fields rendered on the post page, so one `find_one()` is enough.
+        Posts created before that copy existed are merged from `post_info` and `post_content` with a `$lookup`,
+        until `backfill_post_content()` copies their fields.
+        The result is memoized for the current request, so calling it again for the same post is free.
+
+        Note that counters and flags such as `views` or `archived` are only in `post_info`.
 
         Returns:
             dict: A dictionary representing the full post data.
         """
-        post = self._db_handler.post_info.find_one({"post_uid": post_uid})
-        post_content = self._db_handler.post_content.find_one({"post_uid": post_uid}).get("content")
-        post["content"] = post_content
-        return post
+        post_cache = g.setdefault("_post_cache", {})
+        if post_uid in post_cache:
+            return post_cache[post_uid]
+
+        result = self._db_handler.post_content.find_one({"post_uid": post_uid}, {"_id": 0})
+        if result is not None and "created_at" not in result:
+            result = self._get_full_post_with_lookup(post_uid)
+        post_cache[post_uid] = result
+        return result
+
+    def _get_full_post_with_lookup(self, post_uid: str) -> Optional[dict]:
+        result = self._db_handler.post_info.aggregate(
+            [
+                {"$match": {"post_uid": post_uid}},
+                {"$limit": 1},
+                {
+                    "$lookup": {
+                        "from": self._db_handler.post_content.name,
+                        "localField": "post_uid",
+                        "foreignField": "post_uid",
+                        "as": "post_content",
+                    }
+                },
+                {"$unwind": "$post_content"},
+                {"$addFields": {"content": "$post_content.content"}},
+                {"$project": {"post_content": 0}},
+            ]
+        )
+        return result[0] if result else None
 
     def read_increment(self, author: str, post_uid: str) -> None:
         """
         Increases the read count for a specific post.
         Note that the counts won't increase if the user is logged in and viewing their own blog.
+        Repeated visits from the same client address within `VIEW_DEDUP_WINDOW` are counted once.
+        The increment is buffered and written to the database in batches.
 
         No return value.
         """
-        if current_user.is_authenticated and current_user.username == author:
+        if is_viewed_by_author(author):
             return
-        self._db_handler.post_info.make_increments(
-            filter={"post_uid": post_uid}, increments={"reads": 1}
+        counter_buffer.increment(
+            "post_info", "post_uid", post_uid, "reads", visitor=get_visitor_id(request)
         )
 
     def view_increment(self, author: str, post_uid: str) -> None:
         """
         Increases the view count for a specific post.
         Note that the counts won't increase if the user is logged in and viewing their own blog.
+        Repeated visits from the same client address within `VIEW_DEDUP_WINDOW` are counted once.
+        The increment is buffered and written to the database in batches.
 
         No return value.
         """
-        if current_user.is_authenticated and current_user.username == author:
+        if is_viewed_by_author(author):
             return
 
-        self._db_handler.post_info.make_increments(
-            filter={"post_uid": post_uid}, increments={"views": 1}
+        counter_buffer.increment(
+            "post_info", "post_uid", post_uid, "views", visitor=get_visitor_id(request)
         )
@@ -1,12 +1,56 @@
-from dataclasses import asdict
 from datetime import datetime, timezone
+from typing import Optional
 
+from flask import g, request
 from flask_login import current_user
+from pymongo import InsertOne, UpdateOne
+from pymongo.command_cursor import CommandCursor
+from pymongo.errors import DuplicateKeyError
 
 from app.forms.projects import EditProjectForm, NewProjectForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.counters import counter_buffer
+from app.helpers.users import user_info_cache
+from app.helpers.utils import (
+    PAGING_COUNT_FIELDS,
+    UIDGenerator,
+    get_visitor_id,
+    is_viewed_by_author,
+    process_tags,
+    shallow_asdict,
+    uid_generator,
+)
 from app.models.projects import ProjectContent, ProjectInfo
-from app.mongo import Database
+from app.mongo import PROJECT_LIST_INDEX, Database
+
+# Fields needed to render projects as a list of summaries, e.g. on the tag page
+PROJECT_SUMMARY_PROJECTION = {
+    "project_uid": 1,
+    "title": 1,
+    "short_description": 1,
+    "tags": 1,
+    "created_at": 1,
+}
+
+# Fields written to the data export, with `content` joined from `project_content`
+PROJECT_EXPORT_PROJECTION = {
+    "_id": 0,
+    "project_uid": 1,
+    "author": 1,
+    "title": 1,
+    "short_description": 1,
+    "content": 1,
+    "tags": 1,
+    "custom_slug": 1,
+    "images": 1,
+    "created_at": 1,
+    "last_updated": 1,
+    "archived": 1,
+    "views": 1,
+    "reads": 1,
+}
+
+# Names of the (url, caption) field pairs of the image slots in the project forms
+_IMAGE_FIELDS = tuple((f"url{i}", f"caption{i}") for i in range(5))
 
 
 def process_form_images(form: NewProjectForm | EditProjectForm) -> list[tuple[str, str]]:
@@ -18,14 +62,13 @@ def process_form_images(form: NewProjectForm | EditProjectForm) -> list[tuple[st
     Returns:
         list[tuple[str, str]]: A list of tuples containing image URLs and captions.
     """
+    # the fields are read directly, as each access to `form.data` rebuilds a dict of all the fields
     images = []
-    for i in range(5):
-        url = form.data.get(f"url{i}", "")
+    for url_field, caption_field in _IMAGE_FIELDS:
+        url = getattr(form, url_field).data
         if url:
-            caption = form.data.get(f"caption{i}", "")
-            images.append((url, caption))
-    while len(images) < 5:
-        images.append(tuple())
+            images.append((url, getattr(form, caption_field).data or ""))
+    images.extend([()] * (len(_IMAGE_FIELDS) - len(images)))
     return images
 
 
@@ -37,6 +80,7 @@ class NewProjectSetup:
     """
 
     def __init__(self, project_uid_generator: UIDGenerator, db_handler: Database) -> None:
+        self._project_uid_generator = project_uid_generator
         self._project_uid = project_uid_generator.generate_project_uid()
         self._db_handler = db_handler
 
@@ -50,7 +94,7 @@ class NewProjectSetup:
             images=process_form_images(form),
             custom_slug=form.custom_slug.data,
         )
-        return asdict(new_project_info)
+        return shallow_asdict(new_project_info)
 
     def _create_project_content(self, form: NewProjectForm, author_name: str) -> dict:
         new_project_content = ProjectContent(
@@ -58,22 +102,50 @@ class NewProjectSetup:
             author=author_name,
             content=form.editor.data,
         )
-        return asdict(new_project_content)
+        return shallow_asdict(new_project_content)
 
     def create_project(self, form: NewProjectForm, author_name: str) -> str:
         """
         Receives the form data and the author name,
         organizes them into `project_info` and `project_content` dataclasses, converts them to dictionaries,
-        finally inserts them into the database.
+        finally inserts them into the database in a single bulk write, along with the user's project count.
+        The write is retried with a new UID if the UID is taken.
 
         Returns:
             str: The UID of the newly created project.
         """
-        new_project_info = self._create_project_info(form, author_name)
-        new_project_content = self._create_project_content(form, author_name)
-
-        self._db_handler.project_info.insert_one(new_project_info)
-        self._db_handler.project_content.insert_one(new_project_content)
+        project_info = self._db_handler.project_info
+        project_content = self._db_handler.project_content
+        user_info = self._db_handler.user_info
+        while True:
+            new_project_info = self._create_project_info(form, author_name)
+            new_project_content = self._create_project_content(form, author_name)
+            try:
+                self._db_handler.bulk_write(
+                    [
+                        (
+                            project_info,
+                            InsertOne(new_project_info, namespace=project_info.namespace),
+                        ),
+                        (
+                            project_content,
+                            InsertOne(new_project_content, namespace=project_content.namespace),
+                        ),
+                        (
+                            user_info,
+                            UpdateOne(
+                                {"username": author_name},
+                                {"$inc": {PAGING_COUNT_FIELDS["project"]: 1}},
+                                namespace=user_info.namespace,
+                            ),
+                        ),
+                    ]
+                )
+                user_info_cache.invalidate(author_name)
+                break
+            except DuplicateKeyError:
+                # the `project_info` insert comes first, so nothing was written
+                self._project_uid = self._project_uid_generator.generate_project_uid()
         return self._project_uid
 
 
@@ -86,7 +158,6 @@ def create_project(form: NewProjectForm, db_handler: Database) -> str:
     Returns:
         str: The UID of the newly created project.
     """
-    uid_generator = UIDGenerator(db_handler=db_handler)
     new_project_setup = NewProjectSetup(project_uid_generator=uid_generator, db_handler=db_handler)
     new_project_uid = new_project_setup.create_project(author_name=current_user.username, form=form)
     return new_project_uid
@@ -124,6 +195,7 @@ class ProjectUpdateSetup:
         self._db_handler.project_content.update_values(
             filter={"project_uid": project_uid}, update=updated_project_content
         )
+        g.get("_project_cache", {}).pop(project_uid, None)
 
 
 def update_project(project_uid: str, form: EditProjectForm, db_handler: Database) -> None:
@@ -144,24 +216,9 @@ class ProjectsUtils:
     def __init__(self, db_handler: Database) -> None:
         self._db_handler = db_handler
 
-    def get_all_projects_info(self, include_archive=False) -> list[dict]:
-        """
-        Retrieves all `project_info` documents from all users.
-
-        This is mostly used to generate the sitemap.
-
-        Archived projects are excluded by default, but can be included if needed.
-
-        Returns:
-            list[dict]: A list of dictionaries representing `project_info`.
-        """
-        if include_archive:
-            result = self._db_handler.project_info.find({}).as_list()
-        else:
-            result = self._db_handler.project_info.find({"archived": False}).as_list()
-        return result
-
-    def get_project_infos(self, username: str, archive="include") -> list[dict]:
+    def get_project_infos(
+        self, username: str, archive="include", projection: Optional[dict] = None
+    ) -> list[dict]:
         """
         Retrieves all projects' `project_info` documents for the given user.
 
@@ -169,95 +226,181 @@ class ProjectsUtils:
 
         Possible values for `archive`: "exclude", "include", "only".
 
+        Pass `projection` to fetch only the fields needed.
+        Unless archived ones are included, the query is served by `PROJECT_LIST_INDEX` in sorted order.
+
         Returns:
             list[dict]: A list of dictionaries representing `project_info`.
         """
         if archive == "include":
             result = (
-                self._db_handler.project_info.find({"author": username})
+                self._db_handler.project_info.find({"author": username}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "exclude":
             result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
+                self._db_handler.project_info.find(
+                    {"author": username, "archived": False}, projection
+                )
                 .sort("created_at", -1)
+                .hint(PROJECT_LIST_INDEX)
                 .as_list()
             )
         elif archive == "only":
             result = (
-                self._db_handler.project_info.find({"author": username, "archived": True})
+                self._db_handler.project_info.find(
+                    {"author": username, "archived": True}, projection
+                )
                 .sort("created_at", -1)
+                .hint(PROJECT_LIST_INDEX)
                 .as_list()
             )
         return result
 
+    def iter_project_infos_with_content(
+        self, username: str, projection: Optional[dict] = None
+    ) -> CommandCursor:
+        """
+        Iterates over all `project_info` documents of the given user, archived ones included,
+        each joined with the `content` field of its `project_content` document.
+
+        The join is done by the database with `$lookup`, and the documents are streamed in batches,
+        so this is preferred over fetching the contents one by one, e.g. for exporting.
+
+        Pass `projection` to return only the fields needed; it is applied last, after the join.
+
+        Returns:
+            CommandCursor: A cursor yielding dictionaries representing `project_info`, plus `content`.
+        """
+        pipeline = [
+            {"$match": {"author": username}},
+            {"$sort": {"created_at": -1}},
+            {
+                "$lookup": {
+                    "from": self._db_handler.project_content.name,
+                    "localField": "project_uid",
+                    "foreignField": "project_uid",
+                    "as": "content",
+                }
+            },
+            {"$set": {"content": {"$arrayElemAt": ["$content.content", 0]}}},
+        ]
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        return self._db_handler.project_info.iter_aggregate(pipeline, batch_size=100)
+
     def get_project_infos_with_pagination(
-        self, username: str, page_number: int, projects_per_page: int
+        self,
+        username: str,
+        page_number: int,
+        projects_per_page: int,
+        after: Optional[tuple[datetime, str]] = None,
     ) -> list[dict]:
         """
         Retrieves all projects' `project_info` documents for the given user with pagination.
         The page number and the number of projects per page are therefore required.
 
+        If `after` is given, it should be the `created_at` and `project_uid` of the last project on the previous page.
+        The projects are then fetched by seeking past that project instead of skipping all the previous pages,
+        so deep pages are as cheap as the first one.
+
+        Projects are sorted by `created_at` timestamps, with `project_uid` breaking ties.
+
         Note that archived projects are excluded.
 
         Returns:
             list[dict]: A list of dictionaries representing `project_info`.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(projects_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * projects_per_page)
-                .limit(projects_per_page)
-                .as_list()
-            )
+        filter = {"author": username, "archived": False}
+        if after is not None:
+            after_created_at, after_uid = after
+            filter["$or"] = [
+                {"created_at": {"$lt": after_created_at}},
+                {"created_at": after_created_at, "project_uid": {"$lt": after_uid}},
+            ]
+            skip = 0
+        else:
+            skip = max(page_number - 1, 0) * projects_per_page
+
+        result = (
+            self._db_handler.project_info.find(filter)
+            .sort([("created_at", -1), ("project_uid", -1)])
+            .hint(PROJECT_LIST_INDEX)
+            .skip(skip)
+            .limit(projects_per_page)
+            .as_list()
+        )
         return result
 
     def get_full_project(self, project_uid: str) -> dict:
         """
         Retrieves the full project data for a specific project UID.
-        `project_info` and `project_content` are merged into one dictionary by `project_uid`.
+        `project_info` and `project_content` are merged into one dictionary by `project_uid`,
+        with a `$lookup` so that both are fetched in a single query.
+        The result is memoized for the current request, so calling it again for the same project is free.
 
         Returns:
             dict: A dictionary representing the full project data.
         """
-        project = self._db_handler.project_info.find_one({"project_uid": project_uid})
-        project_content = self._db_handler.project_content.find_one(
-            {"project_uid": project_uid}
-        ).get("content")
-        project["content"] = project_content
-        return project
+        project_cache = g.setdefault("_project_cache", {})
+        if project_uid in project_cache:
+            return project_cache[project_uid]
+
+        result = self._db_handler.project_info.aggregate(
+            [
+                {"$match": {"project_uid": project_uid}},
+                {"$limit": 1},
+                {
+                    "$lookup": {
+                        "from": self._db_handler.project_content.name,
+                        "localField": "project_uid",
+                        "foreignField": "project_uid",
+                        "as": "project_content",
+                    }
+                },
+                {"$unwind": "$project_content"},
+                {"$addFields": {"content": "$project_content.content"}},
+                {"$project": {"project_content": 0}},
+            ]
+        )
+        project_cache[project_uid] = result[0] if result else None
+        return project_cache[project_uid]
 
     def read_increment(self, author: str, project_uid: str) -> None:
         """
         Increases the read count for a specific project.
         Note that the counts won't increase if the user is logged in and viewing their own blog.
+        Repeated visits from the same client address within `VIEW_DEDUP_WINDOW` are counted once.
+        The increment is buffered and written to the database in batches.
 
         No return value.
         """
-        if current_user.is_authenticated and current_user.username == author:
+        if is_viewed_by_author(author):
             return
-        self._db_handler.project_info.make_increments(
-            filter={"project_uid": project_uid}, increments={"reads": 1}
+        counter_buffer.increment(
+            "project_info",
+            "project_uid",
+            project_uid,
+            "reads",
+            visitor=get_visitor_id(request),
         )
 
     def view_increment(self, author: str, project_uid: str) -> None:
         """
         Increases the view count for a specific project.
         Note that the counts won't increase if the user is logged in and viewing their own blog.
+        Repeated visits from the same client address within `VIEW_DEDUP_WINDOW` are counted once.
+        The increment is buffered and written to the database in batches.
 
         No return value.
         """
-        if current_user.is_authenticated and current_user.username == author:
+        if is_viewed_by_author(author):
             return
-        self._db_handler.project_info.make_increments(
-            filter={"project_uid": project_uid}, increments={"views": 1}
+        counter_buffer.increment(
+            "project_info",
+            "project_uid",
+            project_uid,
+            "views",
+            visitor=get_visitor_id(request),
         )
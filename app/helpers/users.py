@@ -1,13 +1,54 @@
-from dataclasses import asdict
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import bcrypt
-from flask_login import current_user
+from pymongo import DeleteOne, InsertOne
 
+from app.config import BCRYPT_ROUNDS
 from app.forms.users import SignUpForm
+from app.helpers.counters import counter_buffer
+from app.helpers.utils import TTLCache, is_viewed_by_author, shallow_asdict
 from app.logging import Logger
 from app.models.users import UserAbout, UserCreds, UserInfo
 from app.mongo import Database
 
+# Read-through caches used by `UserUtils.get_user_*()`; writers must invalidate the matching entry
+user_info_cache = TTLCache(maxsize=1024, ttl=30)  # keyed by username
+user_about_cache = TTLCache(maxsize=1024, ttl=30)  # keyed by username
+
+# bcrypt releases the GIL, so hashes run in parallel here; the pool caps them at one per core
+_hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="pwhash")
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_password(password: str) -> str:
+    """Hash a plaintext password with bcrypt at the configured work factor."""
+    return _hash_executor.submit(_hash, password).result()
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Check a plaintext password against a stored bcrypt hash."""
+    return _hash_executor.submit(_verify, password, hashed_password).result()
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Whether a stored hash was made with a work factor other than `BCRYPT_ROUNDS`.
+
+    bcrypt hashes look like `$2b$12$<salt+hash>`, so the cost is the third `$`-separated field.
+    """
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 
 class NewUserSetup:
     """
@@ -21,20 +62,15 @@ class NewUserSetup:
 
     def _create_user_creds(self, username: str, email: str, hashed_password: str) -> dict:
         new_user_creds = UserCreds(username=username, email=email, password=hashed_password)
-        return asdict(new_user_creds)
+        return shallow_asdict(new_user_creds)
 
     def _create_user_info(self, username: str, email: str, blogname: str) -> dict:
         new_user_info = UserInfo(username=username, email=email, blogname=blogname)
-        return asdict(new_user_info)
+        return shallow_asdict(new_user_info)
 
     def _create_user_about(self, username: str) -> dict:
         new_user_about = UserAbout(username=username)
-        return asdict(new_user_about)
-
-    @staticmethod
-    def _hash_password(password: str) -> str:
-        hashed_pw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(12))
-        return hashed_pw.decode("utf-8")
+        return shallow_asdict(new_user_about)
 
     def create_user(self, form: SignUpForm) -> str:
         """
@@ -42,23 +78,33 @@ class NewUserSetup:
         organizes it into `user_creds`, `user_info`, and `user_about` dataclasses,
         which will initialize the necessary fields for a new user,
         converts them to dictionaries,
-        finally inserts them into the database.
+        finally inserts them into the database in a single bulk write.
 
         Returns:
             str: The username of the newly created user.
         """
-        hashed_pw = self._hash_password(form.password.data)
-        new_user_creds = self._create_user_creds(form.username.data, form.email.data, hashed_pw)
+        # the other documents are built while the password is being hashed
+        hashing = _hash_executor.submit(_hash, form.password.data)
         new_user_info = self._create_user_info(
             form.username.data,
             form.email.data,
             form.blogname.data,
         )
         new_user_about = self._create_user_about(form.username.data)
+        new_user_creds = self._create_user_creds(
+            form.username.data, form.email.data, hashing.result()
+        )
 
-        self._db_handler.user_creds.insert_one(new_user_creds)
-        self._db_handler.user_info.insert_one(new_user_info)
-        self._db_handler.user_about.insert_one(new_user_about)
+        user_creds = self._db_handler.user_creds
+        user_info = self._db_handler.user_info
+        user_about = self._db_handler.user_about
+        self._db_handler.bulk_write(
+            [
+                (user_creds, InsertOne(new_user_creds, namespace=user_creds.namespace)),
+                (user_info, InsertOne(new_user_info, namespace=user_info.namespace)),
+                (user_about, InsertOne(new_user_about, namespace=user_about.namespace)),
+            ]
+        )
 
         return form.username.data
 
@@ -68,30 +114,47 @@ class UserDeletionSetup:
     Handles the setup and execution of user deletion.
     """
 
+    _DELETE_BATCH_SIZE = 10000
+
     def __init__(self, username: str, db_handler: Database, logger: Logger) -> None:
         self._user_to_be_deleted = username
         self._db_handler = db_handler
         self._logger = logger
 
     def _get_posts_uid_by_user(self) -> list[str]:
-        posts = self._db_handler.post_info.find({"author": self._user_to_be_deleted})
-        return [post.get("post_uid") for post in posts]
+        # covered by `POST_LIST_INDEX`, which starts with author and contains post_uid
+        posts = self._db_handler.post_info.find_raw(
+            {"author": self._user_to_be_deleted}, {"post_uid": 1, "_id": 0}
+        )
+        return [post["post_uid"] for post in posts]
 
     def _remove_all_posts(self) -> None:
         self._db_handler.post_info.delete_many({"author": self._user_to_be_deleted})
         self._db_handler.post_content.delete_many({"author": self._user_to_be_deleted})
-        self._logger.debug(f"Deleted all posts written by user {self._user_to_be_deleted}.")
+        self._logger.debug("Deleted all posts written by user %s.", self._user_to_be_deleted)
 
     def _remove_all_related_comments(self, post_uids: list[str]) -> None:
-        for post_uid in post_uids:
-            self._db_handler.comment.delete_many({"post_uid": post_uid})
-        self._logger.debug(f"Deleted comments under posts by user {self._user_to_be_deleted}.")
+        # batched so that the `$in` filter stays well below the BSON document size limit
+        comment = self._db_handler.comment
+        with comment.bulk():
+            for i in range(0, len(post_uids), self._DELETE_BATCH_SIZE):
+                batch = post_uids[i : i + self._DELETE_BATCH_SIZE]
+                comment.delete_many({"post_uid": {"$in": batch}})
+        self._logger.debug("Deleted comments under posts by user %s.", self._user_to_be_deleted)
 
     def _remove_all_user_data(self) -> None:
-        self._db_handler.user_creds.delete_one({"username": self._user_to_be_deleted})
-        self._db_handler.user_info.delete_one({"username": self._user_to_be_deleted})
-        self._db_handler.user_about.delete_one({"username": self._user_to_be_deleted})
-        self._logger.debug(f"Deleted user information for user {self._user_to_be_deleted}.")
+        user_filter = {"username": self._user_to_be_deleted}
+        user_creds = self._db_handler.user_creds
+        user_info = self._db_handler.user_info
+        user_about = self._db_handler.user_about
+        self._db_handler.bulk_write(
+            [
+                (user_creds, DeleteOne(user_filter, namespace=user_creds.namespace)),
+                (user_info, DeleteOne(user_filter, namespace=user_info.namespace)),
+                (user_about, DeleteOne(user_filter, namespace=user_about.namespace)),
+            ]
+        )
+        self._logger.debug("Deleted user information for user %s.", self._user_to_be_deleted)
 
     def start_deletion_process(self) -> None:
         """
@@ -125,7 +188,7 @@ class UserUtils:
         Returns:
             list[dict]: A list of usernames
         """
-        all_user_info = self._db_handler.user_info.find({})
+        all_user_info = self._db_handler.user_info.find_raw({}, {"username": 1, "_id": 0})
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_all_username_gallery_enabled(self) -> list[str]:
@@ -137,7 +200,9 @@ class UserUtils:
         Returns:
             list[str]: A list of usernames with gallery enabled.
         """
-        all_user_info = self._db_handler.user_info.find({"gallery_enabled": True})
+        all_user_info = self._db_handler.user_info.find_raw(
+            {"gallery_enabled": True}, {"username": 1, "_id": 0}
+        )
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_all_username_changelog_enabled(self) -> list[str]:
@@ -149,34 +214,48 @@ class UserUtils:
         Returns:
             list[str]: A list of usernames with changelog enabled.
         """
-        all_user_info = self._db_handler.user_info.find({"changelog_enabled": True})
+        all_user_info = self._db_handler.user_info.find_raw(
+            {"changelog_enabled": True}, {"username": 1, "_id": 0}
+        )
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_user_info(self, username: str) -> UserInfo:
         """
         Retrieve `user_info` document by username and return it as a `UserInfo` object.
+        Served from `user_info_cache` when possible.
 
         Returns:
             UserInfo: The user information.
         """
+        cached = user_info_cache.get(username)
+        if cached is not None:
+            return cached
         user_info = self._db_handler.user_info.find_one({"username": username})
         if user_info is None:
             return None
         user_info.pop("_id", None)
-        return UserInfo(**user_info)
+        user_info = UserInfo(**user_info)
+        user_info_cache.set(username, user_info)
+        return user_info
 
     def get_user_about(self, username: str) -> UserAbout:
         """
         Retrieve `user_about` document by username and return it as a `UserAbout` object.
+        Served from `user_about_cache` when possible.
 
         Returns:
             UserAbout: The user about information.
         """
+        cached = user_about_cache.get(username)
+        if cached is not None:
+            return cached
         user_about = self._db_handler.user_about.find_one({"username": username})
         if user_about is None:
             return None
         user_about.pop("_id", None)
-        return UserAbout(**user_about)
+        user_about = UserAbout(**user_about)
+        user_about_cache.set(username, user_about)
+        return user_about
 
     def get_user_creds(self, email: str) -> UserCreds:
         """
@@ -193,7 +272,8 @@ class UserUtils:
 
     def delete_user(self, username: str, logger: Logger) -> None:
         """
-        Wraps `UserDeletionSetup` setup class to delete a user from the database.
+        Wraps `UserDeletionSetup` setup class to delete a user from the database,
+        then drops the user from the caches.
 
         No return value.
         """
@@ -201,6 +281,8 @@ class UserUtils:
             username=username, db_handler=self._db_handler, logger=logger
         )
         user_deletion.start_deletion_process()
+        user_info_cache.invalidate(username)
+        user_about_cache.invalidate(username)
 
     def create_user(self, form: SignUpForm) -> str:
         """
@@ -216,11 +298,10 @@ class UserUtils:
         """
         Increases the total view count for a user.
         Now the counts won't increase if the user is logged in and viewing their own blog.
+        The increment is buffered and written to the database in batches.
 
         No return value.
         """
-        if current_user.is_authenticated and current_user.username == username:
+        if is_viewed_by_author(username):
             return
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments={"total_views": 1}
-        )
+        counter_buffer.increment("user_info", "username", username, "total_views")
@@ -1,76 +1,150 @@
+import hashlib
 import random
 import string
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import fields
+from functools import wraps
 from math import ceil
+from operator import itemgetter
+from typing import Any, Optional
 
 from bs4 import BeautifulSoup
-from flask import abort
+from flask import Request, abort, g
+from flask_login import current_user
 from markdown import Markdown
+from pymongo import UpdateOne
 from typing_extensions import Self
 
 from app.mongo import Database
 
+# Markdown extensions enabled for each kind of content
+_MARKDOWN_EXTENSIONS = {
+    "post": ["markdown_captions", "fenced_code", "footnotes", "toc"],
+    "about": ["markdown_captions", "fenced_code"],
+    "project": ["markdown_captions", "fenced_code", "footnotes", "toc"],
+    "changelog": ["markdown_captions", "fenced_code", "footnotes"],
+}
+# `Markdown` instances are not thread-safe, so each thread keeps its own
+_markdown_instances = threading.local()
+
+
+class TTLCache:
+    """
+    A small thread-safe in-process cache whose entries expire after `ttl` seconds.
+
+    The least recently used entry is evicted once `maxsize` is reached.
+    Use `invalidate()` or `clear()` whenever the cached data is modified.
+    Note that every worker process holds its own copy, so stale entries can live up to `ttl` seconds in other workers.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 30) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value if it exists and has not expired, otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Caches the value for the given key. No return value.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drops the cached value for the given key, if any. No return value.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Drops all the cached values. No return value.
+        """
+        with self._lock:
+            self._entries.clear()
+
 
 class UIDGenerator:
     """
     A generic class to generate UID for new entries in the database.
 
-    It checks the database to ensure the generated UID is unique before returning it.
+    The UIDs are random 8-character strings out of about 2.8 trillion, so they are not looked up in the database beforehand.
+    Instead, the UID fields are backed by unique indexes (see `create_indexes()`),
+    and the rare duplicate raises `DuplicateKeyError` on insert, after which a new UID should be generated.
+
+    It holds no state, so the module-level `uid_generator` is shared by all the setup classes.
     """
 
-    def __init__(self, db_handler: Database) -> None:
-        self._db_handler = db_handler
+    _ALPHABET = string.ascii_lowercase + string.digits
+
+    @staticmethod
+    def _generate_uid() -> str:
+        return "".join(random.choices(UIDGenerator._ALPHABET, k=8))
 
-    def generate_comment_uid(self) -> str:
+    @staticmethod
+    def generate_comment_uid() -> str:
         """
-        Looks into the comment database and generates an UID for a new comment.
+        Generates an UID for a new comment.
 
         Returns:
-            str: A unique comment UID string.
+            str: A random comment UID string.
         """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            comment_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.comment.exists("comment_uid", comment_uid):
-                return comment_uid
+        return UIDGenerator._generate_uid()
 
-    def generate_post_uid(self) -> str:
+    @staticmethod
+    def generate_post_uid() -> str:
         """
-        Looks into the post database and generates an UID for a new post.
+        Generates an UID for a new post.
 
         Returns:
-            str: A unique post UID string.
+            str: A random post UID string.
         """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            post_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.post_info.exists("post_uid", post_uid):
-                return post_uid
+        return UIDGenerator._generate_uid()
 
-    def generate_project_uid(self) -> str:
+    @staticmethod
+    def generate_project_uid() -> str:
         """
-        Looks into the project database and generates an UID for a new project.
+        Generates an UID for a new project.
 
         Returns:
-            str: A unique project UID string.
+            str: A random project UID string.
         """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            project_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.project_info.exists("project_uid", project_uid):
-                return project_uid
+        return UIDGenerator._generate_uid()
 
-    def generate_changelog_uid(self) -> str:
+    @staticmethod
+    def generate_changelog_uid() -> str:
         """
-        Looks into the changelog database and generates an UID for a new changelog entry.
+        Generates an UID for a new changelog entry.
 
         Returns:
-            str: A unique changelog UID string.
+            str: A random changelog UID string.
         """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            changelog_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.changelog.exists("changelog_uid", changelog_uid):
-                return changelog_uid
+        return UIDGenerator._generate_uid()
+
+
+uid_generator = UIDGenerator()
 
 
 class HTMLFormatter:
@@ -82,24 +156,38 @@ class HTMLFormatter:
     This formatter is meant for styling blog posts, about page, and project pages.
 
     It takes in an HTML string. Once the modifications are done, use the `to_string()` method to get the formatted HTML as string.
+    The chained methods only select the modifications, which are then applied in one walk over the tree by `to_string()`.
     """
 
+    # New tag name and classes of each heading level
+    _HEADINGS = {
+        "h3": ("h6", "pt-2 pb-1 fw-bold"),
+        "h2": ("h5", "pt-3 pb-1 fw-bold"),
+        "h1": ("h2", "pt-4 pb-1 fw-bold"),
+    }
+    _FIGURE_CLASSES = {
+        "figure": ("figure", "w-100", "mx-auto"),
+        "img": ("lazyload", "figure-img", "img-fluid", "rounded", "w-100"),
+        "figcaption": ("figure-caption", "text-center", "py-2"),
+    }
+
     def __init__(self, html: str) -> None:
-        self._soup = BeautifulSoup(html, "html.parser")
+        # lxml parses full documents, so the fragment is opened with <body> to keep leading
+        # comments and <style> tags out of <head>, and the formatting is applied inside <body>
+        self._soup = BeautifulSoup("<body>" + html, "lxml").body
+        self._add_padding = False
+        self._change_headings = False
+        self._modify_figure = False
+        self._modify_hyperlink = False
 
     def add_padding(self) -> Self:
         """
-        Append `py-1` class to HTML elements except 'figure' and 'img'.
+        Append `py-1` class to top-level HTML elements except 'figure' and 'img'.
 
         Returns:
             HTMLFormatter: The formatter instance.
         """
-        blocks = self._soup.find_all(lambda tag: tag.name not in ["figure", "img"], recursive=False)
-        for block in blocks:
-            current_class = block.get("class", [])
-            current_class.append("py-1")
-            block["class"] = current_class
-
+        self._add_padding = True
         return self
 
     def change_headings(self) -> Self:
@@ -109,21 +197,7 @@ class HTMLFormatter:
         Returns:
             HTMLFormatter: The formatter instance.
         """
-        small_headings = self._soup.find_all("h3")
-        for heading in small_headings:
-            heading.name = "h6"
-            heading["class"] = "pt-2 pb-1 fw-bold"
-
-        medium_headings = self._soup.find_all("h2")
-        for heading in medium_headings:
-            heading.name = "h5"
-            heading["class"] = "pt-3 pb-1 fw-bold"
-
-        big_headings = self._soup.find_all("h1")
-        for heading in big_headings:
-            heading.name = "h2"
-            heading["class"] = "pt-4 pb-1 fw-bold"
-
+        self._change_headings = True
         return self
 
     def modify_figure(self) -> Self:
@@ -133,27 +207,7 @@ class HTMLFormatter:
         Returns:
             HTMLFormatter: The formatter instance.
         """
-        figures = self._soup.find_all("figure")
-        for figure in figures:
-            current_class = figure.get("class", [])
-            current_class.extend(["figure", "w-100", "mx-auto"])
-            figure["class"] = current_class
-
-        imgs = self._soup.find_all(["img"])
-        for img in imgs:
-            img_src = img["src"]
-            img["src"] = ""
-            img["data-src"] = img_src
-            current_class = img.get("class", [])
-            current_class.extend(["lazyload", "figure-img", "img-fluid", "rounded", "w-100"])
-            img["class"] = current_class
-
-        captions = self._soup.find_all(["figcaption"])
-        for caption in captions:
-            current_class = caption.get("class", [])
-            current_class.extend(["figure-caption", "text-center", "py-2"])
-            caption["class"] = current_class
-
+        self._modify_figure = True
         return self
 
     def modify_hyperlink(self) -> Self:
@@ -163,24 +217,83 @@ class HTMLFormatter:
         Returns:
             HTMLFormatter: The formatter instance.
         """
-        links = self._soup.find_all("a")
-        for link in links:
-            current_class = link.get("class", [])
-            current_class.extend(["in-content-link"])
-            link["class"] = current_class
-
+        self._modify_hyperlink = True
         return self
 
+    def _apply(self) -> None:
+        for element in self._soup.find_all(True):
+            name = element.name
+
+            if self._change_headings and name in self._HEADINGS:
+                # the heading styles replace any other class, including the padding
+                element.name, element["class"] = self._HEADINGS[name]
+                continue
+
+            # the classes to add are collected first, so the class list is rebuilt at most once
+            added = []
+            if self._add_padding and element.parent is self._soup and name not in ("figure", "img"):
+                added.append("py-1")
+            if self._modify_figure and name in self._FIGURE_CLASSES:
+                if name == "img":
+                    element["data-src"] = element["src"]
+                    element["src"] = ""
+                added.extend(self._FIGURE_CLASSES[name])
+            if self._modify_hyperlink and name == "a":
+                added.append("in-content-link")
+
+            if added:
+                element["class"] = element.get("class", []) + added
+
     def to_string(self) -> str:
         """
-        Convert the formatted HTML back to a string.
+        Apply the selected modifications and convert the formatted HTML back to a string.
 
         Returns:
             str: The formatted HTML string.
         """
-        return str(self._soup)
+        self._apply()
+        return self._soup.decode_contents()
+
+
+def _get_markdown(kind: str) -> Markdown:
+    """
+    Returns the calling thread's `Markdown` instance for the kind of content, reset for a new document.
+
+    Building a `Markdown` instance registers every extension and compiles their patterns,
+    so it is done once per thread and kind instead of on every conversion.
+    """
+    instances = _markdown_instances.__dict__.setdefault("by_kind", {})
+    md = instances.get(kind)
+    if md is None:
+        md = instances[kind] = Markdown(extensions=_MARKDOWN_EXTENSIONS[kind])
+    return md.reset()
+
+
+# Rendered HTML keyed by a digest of its Markdown source. The keys change whenever the source does,
+# so entries never go stale and the TTL only bounds how long unused pages are kept.
+_rendered_html_cache = TTLCache(maxsize=512, ttl=60 * 60)
+
+
+def _memoize_rendering(convert: Callable[[str], str]) -> Callable[[str], str]:
+    """
+    Decorates a `convert_*` function to look up the rendered HTML in `_rendered_html_cache`
+    before running the Markdown and BeautifulSoup pipeline.
+    """
+
+    @wraps(convert)
+    def wrapper(source: str) -> str:
+        digest = hashlib.blake2b(source.encode("utf-8"), digest_size=16).digest()
+        key = (convert.__name__, digest)
+        html = _rendered_html_cache.get(key)
+        if html is None:
+            html = convert(source)
+            _rendered_html_cache.set(key, html)
+        return html
 
+    return wrapper
 
+
+@_memoize_rendering
 def convert_post_content(content: str) -> str:
     """
     Convert the text stored as Markdown format to HTML string and add additional styling tp look better as a blog post.
@@ -188,14 +301,14 @@ def convert_post_content(content: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes", "toc"])
-    html = md.convert("[TOC]\r\n\r\n" + content)
+    html = _get_markdown("post").convert("[TOC]\r\n\r\n" + content)
     formatter = HTMLFormatter(html)
     html = formatter.add_padding().change_headings().modify_figure().modify_hyperlink().to_string()
 
     return html
 
 
+@_memoize_rendering
 def convert_about(about: str) -> str:
     """
     Convert the text stored as Markdown format to HTML string and add additional styling to look better on the about page.
@@ -203,14 +316,14 @@ def convert_about(about: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code"])
-    html = md.convert(about)
+    html = _get_markdown("about").convert(about)
     formatter = HTMLFormatter(html)
     html = formatter.add_padding().change_headings().modify_figure().to_string()
 
     return html
 
 
+@_memoize_rendering
 def convert_project_content(content: str) -> str:
     """
     Convert the text stored as Markdown format to HTML string and add additional styling to look better on the project page.
@@ -218,14 +331,14 @@ def convert_project_content(content: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes", "toc"])
-    html = md.convert(content)
+    html = _get_markdown("project").convert(content)
     formatter = HTMLFormatter(html)
     html = formatter.add_padding().change_headings().modify_figure().to_string()
 
     return html
 
 
+@_memoize_rendering
 def convert_changelog_content(content: str) -> str:
     """
     Convert the text stored as Markdown format to HTML string and add additional styling to look better on the changelog page.
@@ -233,19 +346,29 @@ def convert_changelog_content(content: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes"])
-    html = md.convert(content)
+    html = _get_markdown("changelog").convert(content)
     formatter = HTMLFormatter(html)
     html = formatter.add_padding().change_headings().modify_figure().to_string()
 
     return html
 
 
+# Fields of `user_info` holding the author's number of non-archived entries, used by `Paging.setup()`.
+# Creating, archiving, restoring or deleting an entry must `$inc` the matching field in the same write.
+PAGING_COUNT_FIELDS = {
+    "post": "post_count",
+    "project": "project_count",
+    "changelog": "changelog_count",
+}
+
+
 class Paging:
     """
     A class to handle pagination for the user's posts, projects, and changelogs.
 
     Use `setup()` method to set up the pagination, then pass the instance to the template to decide if the prev/next button is allowed.
+    The number of entries is read from the counter kept in `user_info`, so paging through a list doesn't count the entries.
+    Users whose counters have not been backfilled yet fall back to counting them.
     """
 
     def __init__(self, db_handler: Database) -> None:
@@ -255,6 +378,18 @@ class Paging:
         self._allow_next_page = None
         self._current_page = None
 
+    def _count_not_archived(self, username: str, content: str) -> int:
+        # factory mode
+        if content == "post":
+            collection = self._db_handler.post_info
+        elif content == "project":
+            collection = self._db_handler.project_info
+        elif content == "changelog":
+            collection = self._db_handler.changelog
+        else:
+            raise Exception("Unknown content option for paging class.")
+        return collection.count_documents({"author": username, "archived": False})
+
     def setup(self, username: str, content: str, current_page: int, num_per_page: int) -> Self:
         """
         Setting up the pagination for the corresponding content.
@@ -270,21 +405,13 @@ class Paging:
         self._current_page = current_page
 
         # set up for pagination
-        # factory mode
-        if content == "post":
-            not_archived_count = self._db_handler.post_info.count_documents(
-                {"author": username, "archived": False}
-            )
-        elif content == "project":
-            not_archived_count = self._db_handler.project_info.count_documents(
-                {"author": username, "archived": False}
-            )
-        elif content == "changelog":
-            not_archived_count = self._db_handler.changelog.count_documents(
-                {"author": username, "archived": False}
-            )
-        else:
+        count_field = PAGING_COUNT_FIELDS.get(content)
+        if count_field is None:
             raise Exception("Unknown content option for paging class.")
+        user_info = self._db_handler.user_info.find_one_fields({"username": username}, count_field)
+        not_archived_count = (user_info or {}).get(count_field)
+        if not_archived_count is None:
+            not_archived_count = self._count_not_archived(username, content)
 
         if not_archived_count == 0:
             max_page = 1
@@ -322,6 +449,52 @@ class Paging:
         return self._current_page
 
 
+def backfill_paging_counts(db_handler: Database) -> int:
+    """
+    Sets the `user_info` counters of non-archived entries read by `Paging.setup()` from the actual entries,
+    i.e. for users created before the counters were kept. Until then, their entries are counted on every page.
+
+    This is a one-off migration, run with `flask --app run backfill-paging-counts`.
+    Entries created, archived or deleted while it runs may be miscounted, so run it while the site is quiet.
+
+    Returns:
+        int: The number of `user_info` documents updated.
+    """
+    collections = {
+        "post": db_handler.post_info,
+        "project": db_handler.project_info,
+        "changelog": db_handler.changelog,
+    }
+    counts = {}
+    for content, collection in collections.items():
+        grouped = collection.aggregate(
+            [
+                {"$match": {"archived": False}},
+                {"$group": {"_id": "$author", "count": {"$sum": 1}}},
+            ]
+        )
+        counts[content] = {doc["_id"]: doc["count"] for doc in grouped}
+
+    usernames = [
+        doc["username"] for doc in db_handler.user_info.find_raw({}, {"username": 1, "_id": 0})
+    ]
+    for start in range(0, len(usernames), 1000):
+        requests = [
+            UpdateOne(
+                {"username": username},
+                {
+                    "$set": {
+                        count_field: counts[content].get(username, 0)
+                        for content, count_field in PAGING_COUNT_FIELDS.items()
+                    }
+                },
+            )
+            for username in usernames[start : start + 1000]
+        ]
+        db_handler.user_info.bulk_write(requests)
+    return len(usernames)
+
+
 def slicing_title(text: str, max_len: int) -> str:
     """
     Truncate the input string to the given max length, with trailing ellipsis if truncated.
@@ -345,20 +518,51 @@ def sort_dict(_dict: dict[str, int]) -> dict[str, int]:
     Returns:
         dict: The sorted dictionary.
     """
-    sorted_dict_key = sorted(_dict, key=_dict.get, reverse=True)
-    sorted_dict = {}
-    for key in sorted_dict_key:
-        sorted_dict[key] = _dict[key]
-    return sorted_dict
+    return dict(sorted(_dict.items(), key=itemgetter(1), reverse=True))
 
 
 def process_tags(tag_string: str) -> list[str]:
     """
     Process a comma-separated tag string into a list of tags.
+    Whitespace around the tags is stripped, and empty tags are dropped.
 
     Returns:
         list[str]: The list of processed tags.
     """
-    if tag_string == "":
-        return []
-    return [tag.strip(" ") for tag in tag_string.split(",")]
+    return [tag for tag in map(str.strip, tag_string.split(",")) if tag]
+
+
+def shallow_asdict(obj: Any) -> dict:
+    """
+    Converts a flat dataclass instance into a dictionary, field by field.
+
+    Unlike `dataclasses.asdict()`, the values are not deep-copied, so lists are shared with the instance.
+    This is what the models need before being inserted into the database.
+
+    Returns:
+        dict: The dictionary of the dataclass fields.
+    """
+    return {field.name: getattr(obj, field.name) for field in fields(obj)}
+
+
+def get_visitor_id(request: Request) -> str:
+    """
+    Returns an anonymized ID of the visitor, used to count repeated views and reads once.
+
+    It is a blake2b hash of `request.remote_addr`. In prod, `ProxyFix` sets it to the address appended by the trusted proxy,
+    so it can't be rotated by sending a forged `X-Forwarded-For` header. Without the header, it is the peer address.
+    """
+    remote_addr = request.remote_addr or ""
+    return hashlib.blake2b(remote_addr.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def is_viewed_by_author(author: str) -> bool:
+    """
+    Whether the request comes from the logged-in author, whose own views are not counted.
+
+    The logged-in username is read from the `current_user` proxy once per request and kept in `g`,
+    since a single page view updates several counters.
+    """
+    if "viewer_username" not in g:
+        g.viewer_username = current_user.username if current_user.is_authenticated else None
+    return g.viewer_username == author
@@ -1,35 +1,86 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import string
 import sys
-from typing import Optional
+from typing import Any, Callable, Optional
 
 from flask import Request
 
 from app.config import ENV
 
 
-def return_client_ip(request: Request, env: str) -> Optional[str]:
+def _remote_addr(request: Request) -> Optional[str]:
+    return request.remote_addr
+
+
+def _forwarded_for(request: Request) -> Optional[str]:
+    return request.headers.get("X-Forwarded-For")
+
+
+def _no_client_ip(request: Request) -> None:
+    return None
+
+
+# Where the client's IP address is found in each environment
+_CLIENT_IP_RESOLVERS = {"dev": _remote_addr, "prod": _forwarded_for}
+
+# The resolver for the current environment, picked once at import
+get_client_ip: Callable[[Request], Optional[str]] = _CLIENT_IP_RESOLVERS.get(ENV, _no_client_ip)
+
+
+# Whitespace and periods around messages are trimmed in one pass, as the templates add the period
+_MSG_STRIP_CHARS = string.whitespace + "."
+
+# Formatters shared by the handlers, built once at import
+_PROD_STREAM_FORMATTER = logging.Formatter(fmt="%(levelname)s: %(message)s")
+_DEV_STREAM_FORMATTER = logging.Formatter(fmt="[%(asctime)s] %(levelname)s: %(message)s")
+_DEV_FILE_FORMATTER = logging.Formatter(
+    fmt="[%(asctime)s] %(levelname)s in %(funcName)s, %(module)s: %(message)s"
+)
+
+
+# The thread writing the queued records, None once stopped
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
     """
-    Returns the client's IP address based on the environment.
+    Writes out the queued records and stops the listener thread. Safe to call more than once.
     """
-    if env == "dev":
-        return request.remote_addr
-    elif env == "prod":
-        return request.headers.get("X-Forwarded-For")
-    return None
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
 
 def _setup_prod_logger() -> logging.Logger:
     """
     Sets up the production logger. Returns a logger instance.
+
+    The logger level matches the handler's INFO level,
+    so debug calls return right away instead of building records that the handler drops.
+
+    Records are put on a queue and written to stdout by a `QueueListener` thread,
+    so logging calls return without waiting on the stream.
     """
     logger = logging.getLogger("app")
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(logging.INFO)
 
-    formatter = logging.Formatter(fmt="%(levelname)s: %(message)s")
     stream_handler = logging.StreamHandler(stream=sys.stdout)
-    stream_handler.setFormatter(formatter)
+    stream_handler.setFormatter(_PROD_STREAM_FORMATTER)
     stream_handler.setLevel(logging.INFO)
-    logger.addHandler(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(logging.INFO)
+    logger.addHandler(queue_handler)
+
+    global _queue_listener
+    _queue_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _queue_listener.start()
+    atexit.register(_stop_queue_listener)
     return logger
 
 
@@ -40,24 +91,28 @@ def _setup_dev_logger() -> logging.Logger:
     werkzeug_logger = logging.getLogger("werkzeug")
     werkzeug_logger.setLevel(logging.ERROR)
 
-    stream_formatter = logging.Formatter(fmt="[%(asctime)s] %(levelname)s: %(message)s")
-    file_formatter = logging.Formatter(
-        fmt="[%(asctime)s] %(levelname)s in %(funcName)s, %(module)s: %(message)s"
-    )
-
     logger = logging.getLogger("app")
     logger.setLevel(logging.DEBUG)
 
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(stream_formatter)
+    stream_handler.setFormatter(_DEV_STREAM_FORMATTER)
     stream_handler.setLevel(logging.DEBUG)
     logger.addHandler(stream_handler)
 
+    # the file is written by a `QueueListener` thread as in prod, so it keeps up with the console
     file_handler = logging.FileHandler("app.log", "w", "utf-8")
-    file_handler.setFormatter(file_formatter)
+    file_handler.setFormatter(_DEV_FILE_FORMATTER)
     file_handler.setLevel(logging.DEBUG)
-    logger.addHandler(file_handler)
 
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(logging.DEBUG)
+    logger.addHandler(queue_handler)
+
+    global _queue_listener
+    _queue_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _queue_listener.start()
+    atexit.register(_stop_queue_listener)
     return logger
 
 
@@ -65,6 +120,8 @@ class Logger:
     """
     Wrapper class for logging based on the environment (dev or prod).
     Provides methods for logging debug, info, warning, and error messages.
+
+    Like the standard logger, the optional args are %-formatted into the message only if it is emitted.
     """
 
     def __init__(self, env: str) -> None:
@@ -75,17 +132,39 @@ class Logger:
         else:
             raise ValueError("Invalid environment specified. Use 'dev' or 'prod'.")
 
-    def debug(self, msg: str) -> None:
-        self._logger.debug(msg)
+    def is_debug_enabled(self) -> bool:
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, msg: str, *args: Any) -> None:
+        self._logger.debug(msg, *args)
+
+    def info(self, msg: str, *args: Any) -> None:
+        self._logger.info(msg, *args)
+
+    def warning(self, msg: str, *args: Any) -> None:
+        self._logger.warning(msg, *args)
 
-    def info(self, msg: str) -> None:
-        self._logger.info(msg)
+    def error(self, msg: str, *args: Any) -> None:
+        self._logger.error(msg, *args)
 
-    def warning(self, msg: str) -> None:
-        self._logger.warning(msg)
+    def flush(self) -> None:
+        """
+        Writes out the records still queued or buffered by the handlers.
+        Meant for exiting without running the `atexit` hooks, e.g. with `os._exit()`.
+        """
+        _stop_queue_listener()
+        for handler in self._logger.handlers:
+            handler.flush()
 
-    def error(self, msg: str) -> None:
-        self._logger.error(msg)
+
+# Backstage panels logged by `LoggerUtils.pagination()`, by endpoint
+_PANEL_BY_ENDPOINT = {
+    "backstage.posts_panel": "posts",
+    "backstage.projects_panel": "projects",
+    "backstage.archive_panel": "archive",
+    "backstage.changelog_panel": "changelog",
+}
+_PANEL_NAMES = tuple(_PANEL_BY_ENDPOINT.values())
 
 
 class LoggerUtils:
@@ -94,7 +173,7 @@ class LoggerUtils:
     Provides methods for logging specific events.
     """
 
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(self, logger: Logger) -> None:
         self._logger = logger
 
     def login_failed(self, request: Request, msg: str) -> None:
@@ -102,54 +181,55 @@ class LoggerUtils:
         Logs a failed login attempt. Log level: DEBUG.
         Needs to pass the reason for the failure to form the message.
         """
-        msg = msg.strip().strip(".")
-        client_ip = return_client_ip(request, ENV)
-        self._logger.debug(f"{client_ip} - Login failed. Msg: {msg}.")
+        if not self._logger.is_debug_enabled():
+            return
+        msg = msg.strip(_MSG_STRIP_CHARS)
+        client_ip = get_client_ip(request)
+        self._logger.debug("%s - Login failed. Msg: %s.", client_ip, msg)
 
     def login_succeeded(self, request: Request, username: str) -> None:
         """
         Logs a successful login event. Log level: INFO.
         """
-        client_ip = return_client_ip(request, ENV)
-        self._logger.info(f"{client_ip} - User {username} has logged in.")
+        client_ip = get_client_ip(request)
+        self._logger.info("%s - User %s has logged in.", client_ip, username)
 
     def logout(self, request: Request, username: str) -> None:
         """
         Logs a user logout event. Log level: INFO.
         """
-        client_ip = return_client_ip(request, ENV)
-        self._logger.info(f"{client_ip} - User {username} has logged out.")
+        client_ip = get_client_ip(request)
+        self._logger.info("%s - User %s has logged out.", client_ip, username)
 
     def registration_failed(self, request: Request, msg: str) -> None:
         """
         Logs a failed registration attempt. Log level: DEBUG.
         Needs to pass the reason for the failure to form the message.
         """
-        msg = msg.strip().strip(".")
-        client_ip = return_client_ip(request, ENV)
-        self._logger.debug(f"{client_ip} - Registration failed. Msg: {msg}.")
+        if not self._logger.is_debug_enabled():
+            return
+        msg = msg.strip(_MSG_STRIP_CHARS)
+        client_ip = get_client_ip(request)
+        self._logger.debug("%s - Registration failed. Msg: %s.", client_ip, msg)
 
     def registration_succeeded(self, username: str) -> None:
         """
         Logs a successful registration event. Log level: INFO.
         """
-        self._logger.info(f"New user {username} has been created.")
+        self._logger.info("New user %s has been created.", username)
 
     def pagination(self, request: Request, page: int, count: int) -> None:
         """
         Logs pagination events. Log level: DEBUG.
         """
-        if "posts" in request.url:
-            panel = "posts"
-        elif "projects" in request.url:
-            panel = "projects"
-        elif "archive" in request.url:
-            panel = "archive"
-        elif "changelog" in request.url:
-            panel = "changelog"
-        else:
+        if not self._logger.is_debug_enabled():
+            return
+        panel = _PANEL_BY_ENDPOINT.get(request.endpoint)
+        if panel is None:
+            panel = next((name for name in _PANEL_NAMES if name in request.url), None)
+        if panel is None:
             raise Exception("Unknown pagination option in logger_utils.pagination.")
-        self._logger.debug(f"Showing {count} records at page {page} of {panel} panel.")
+        self._logger.debug("Showing %s records at page %s of %s panel.", count, page, panel)
 
 
 logger = Logger(env=ENV)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 
@@ -33,6 +33,6 @@ class Changelog:
     tags: list[str]
     link: str = ""
     link_description: str = ""
-    created_at: datetime = datetime.now(timezone.utc)
-    last_updated: datetime = datetime.now(timezone.utc)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    last_updated: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     archived: bool = False
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 
@@ -32,8 +32,8 @@ class PostInfo:
     tags: list[str]
     cover_url: str
     custom_slug: str
-    created_at: datetime = datetime.now(timezone.utc)
-    last_updated: datetime = datetime.now(timezone.utc)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    last_updated: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     archived: bool = False
     featured: bool = False
     views: int = 0
@@ -47,8 +47,26 @@ class PostContent:
     - `post_uid` -> should be generated by `post_uid_generator.generate_post_uid()`
     - `author`
     - `content`
+
+    Copied from `PostInfo`, so that the post page can be rendered from `post_content` alone:
+    - `title`
+    - `subtitle`
+    - `tags`
+    - `cover_url`
+    - `custom_slug`
+    - `created_at`
+    - `last_updated`
+
+    These must be kept in sync with `post_info` when the post is updated.
     """
 
     post_uid: str
     author: str
     content: str
+    title: str
+    subtitle: str
+    tags: list[str]
+    cover_url: str
+    custom_slug: str
+    created_at: datetime
+    last_updated: datetime
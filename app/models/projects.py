@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Tuple
 
@@ -32,8 +32,8 @@ class ProjectInfo:
     tags: list[str]
     images: list[Tuple[str, str]]
     custom_slug: str
-    created_at: datetime = datetime.now(timezone.utc)
-    last_updated: datetime = datetime.now(timezone.utc)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    last_updated: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     archived: bool = False
     views: int = 0
     reads: int = 0
@@ -1,23 +1,38 @@
 import random
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from functools import cache
+from typing import Tuple
 
 from flask import url_for
 from flask_login import UserMixin
 
 
+# The static URLs are built on first use and then reused,
+# since `url_for()` needs an app context and does routing work on every call
+@cache
+def _profile_img_urls() -> tuple[str, ...]:
+    return tuple(url_for("static", filename=f"img/profile{idx}.png") for idx in range(5))
+
+
+@cache
+def default_cover_url() -> str:
+    """
+    Returns the url of the default cover image.
+    """
+    return url_for("static", filename="img/default-cover.jpg")
+
+
 def select_profile_img() -> str:
     """
     Returns a random profile image url.
 
     Available options: img/profile{0-4}.png
     """
-    idx = random.choice(range(5))
-    return url_for("static", filename=f"img/profile{idx}.png")
+    return _profile_img_urls()[random.randrange(5)]
 
 
-@dataclass
+@dataclass(slots=True)
 class UserInfo(UserMixin):
     """
     This `UserInfo` inherits from `UserMixin` and is used in the `user_loader()` callback function for `flask_login`.
@@ -37,6 +52,7 @@ class UserInfo(UserMixin):
     - `changelog_enabled`
     - `total_views`
     - `tags`
+    - `post_count`, `project_count`, `changelog_count` -> numbers of non-archived entries, used for paging
     """
 
     username: str
@@ -44,23 +60,22 @@ class UserInfo(UserMixin):
     blogname: str
     profile_img_url: str = ""
     cover_url: str = ""
-    created_at: Optional[datetime] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     short_bio: str = ""
-    social_links: list[Tuple[str, str]] = None
+    social_links: list[Tuple[str, str]] = field(default_factory=lambda: [[] for _ in range(5)])
     gallery_enabled: bool = False
     changelog_enabled: bool = False
     total_views: int = 0
     tags: dict[str, int] = field(default_factory=dict)
+    post_count: int = 0
+    project_count: int = 0
+    changelog_count: int = 0
 
     def __post_init__(self):
         if not self.profile_img_url:
             self.profile_img_url = select_profile_img()
         if not self.cover_url:
-            self.cover_url = url_for("static", filename="img/default-cover.jpg")
-        if self.created_at is None:
-            self.created_at = datetime.now(timezone.utc)
-        if self.social_links is None:
-            self.social_links = [[]] * 5
+            self.cover_url = default_cover_url()
 
     def get_id(self) -> str:
         """Overrides the get_id method from UserMixin to return the username.
@@ -71,13 +86,13 @@ class UserInfo(UserMixin):
         return self.username
 
 
-@dataclass
+@dataclass(slots=True)
 class UserCreds:
     """
     Data required to create a new `UserCreds`:
     - `username`
     - `email`
-    - `password` -> should be hashed using `_hash_password()` in `create_user()`
+    - `password` -> should be hashed using `hash_password()` in `create_user()`
     """
 
     username: str
@@ -85,7 +100,7 @@ class UserCreds:
     password: str
 
 
-@dataclass
+@dataclass(slots=True)
 class UserAbout:
     """
     Data required to create a new `UserAbout`:
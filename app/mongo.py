@@ -1,26 +1,49 @@
+import atexit
+import threading
+from collections.abc import Iterator
 from contextlib import contextmanager
-from typing import Any, Optional
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Optional, Union
 
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument
 from pymongo.collection import Collection
+from pymongo.command_cursor import CommandCursor
 from pymongo.cursor import Cursor
+from pymongo.errors import (
+    BulkWriteError,
+    ClientBulkWriteException,
+    DuplicateKeyError,
+)
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, UpdateOne
+from pymongo.write_concern import WriteConcern
 from typing_extensions import Self
 
 from app.config import MONGO_URL
 
+WriteOperation = Union[InsertOne, UpdateOne, DeleteOne, DeleteMany]
+
 
 class ExtendedCollection:
     """
     This class extends the `Collection` class from `pymongo` and provides additional methods for working with MongoDB collections.
 
     Modified or new methods:
+    - `aggregate`
+    - `iter_aggregate`
     - `find`
+    - `find_raw`
     - `find_one`
+    - `find_one_fields`
     - `exists`
     - `update_values`
     - `make_increments`
+    - `find_and_update_values`
+    - `bulk`
 
-    Other methods inherited and unchanged:
+    Other methods inherited and unchanged, except that their writes are queued inside `bulk()`:
+    - `bulk_write`
+    - `create_index`
     - `insert_one`
     - `count_documents`
     - `delete_one`
@@ -28,14 +51,84 @@ class ExtendedCollection:
     - `update_one`
     """
 
+    __slots__ = ("_col", "_batch")
+
     def __init__(self, collection: Collection) -> None:
         self._col = collection
+        # writes queued by `bulk()`, per thread since collections are shared across requests
+        self._batch = threading.local()
+
+    def _queue(self, operation: WriteOperation) -> bool:
+        """
+        Queues the write operation if a `bulk()` block is open in this thread.
+        Returns True if it was queued, False if it should be sent right away.
+        """
+        pending = getattr(self._batch, "operations", None)
+        if pending is None:
+            return False
+        pending.append(operation)
+        return True
+
+    @contextmanager
+    def bulk(self) -> Iterator[None]:
+        """
+        Queues the writes made through this collection inside the block,
+        then sends them to the server in a single unordered `bulk_write()` when the block exits.
+
+        Nothing is written if the block raises. Blocks can't be nested.
+
+        Example usage:
+        ```
+        with db.comment.bulk():
+            for batch in batches:
+                db.comment.delete_many({"post_uid": {"$in": batch}})
+        ```
+        """
+        if getattr(self._batch, "operations", None) is not None:
+            raise RuntimeError("bulk() blocks can't be nested.")
+        pending: list[WriteOperation] = []
+        self._batch.operations = pending
+        try:
+            yield
+        finally:
+            self._batch.operations = None
+        if pending:
+            self._col.bulk_write(pending, ordered=False)
+
+    @property
+    def namespace(self) -> str:
+        """
+        The full name of the collection, i.e. `<database>.<collection>`.
+
+        Write operations passed to `Database.bulk_write()` should be created with this as their `namespace`.
+        """
+        return self._col.full_name
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the collection, e.g. to be used as the `from` collection of a `$lookup` stage.
+        """
+        return self._col.name
+
+    def bulk_write(self, requests: list[WriteOperation], ordered: bool = True) -> None:
+        """
+        See `Collection.bulk_write()` for information.
+        """
+        self._col.bulk_write(requests, ordered=ordered)
+
+    def create_index(self, keys: list[tuple[str, int]], **kwargs: Any) -> str:
+        """
+        See `Collection.create_index()` for information.
+        """
+        return self._col.create_index(keys, **kwargs)
 
     def insert_one(self, document: dict[str, Any]) -> None:
         """
         See `Collection.insert_one()` for information.
         """
-        self._col.insert_one(document)
+        if not self._queue(InsertOne(document)):
+            self._col.insert_one(document)
 
     def count_documents(self, filter: dict[str, Any]) -> int:
         """
@@ -47,13 +140,15 @@ class ExtendedCollection:
         """
         See `Collection.delete_one()` for information.
         """
-        self._col.delete_one(filter)
+        if not self._queue(DeleteOne(filter)):
+            self._col.delete_one(filter)
 
     def delete_many(self, filter: dict[str, Any]) -> None:
         """
         See `Collection.delete_many()` for information.
         """
-        self._col.delete_many(filter)
+        if not self._queue(DeleteMany(filter)):
+            self._col.delete_many(filter)
 
     def update_one(
         self, filter: dict[str, Any], update: dict[str, Any], upsert: bool = False
@@ -61,30 +156,83 @@ class ExtendedCollection:
         """
         See `Collection.update_one()` for information.
         """
-        self._col.update_one(filter, update, upsert=upsert)
+        if not self._queue(UpdateOne(filter, update, upsert=upsert)):
+            self._col.update_one(filter, update, upsert=upsert)
+
+    def aggregate(self, pipeline: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        See `Collection.aggregate()` for information.
 
-    def find(self, filter: dict[str, Any]) -> "ExtendedCursor":
+        Note that this method returns the resulting documents as a list instead of a `CommandCursor` object.
+        """
+        return list(self._col.aggregate(pipeline))
+
+    def iter_aggregate(
+        self, pipeline: list[dict[str, Any]], batch_size: Optional[int] = None
+    ) -> CommandCursor:
+        """
+        See `Collection.aggregate()` for information.
+
+        Unlike `aggregate()`, the cursor is returned so that the resulting documents can be streamed in batches.
+        The server's default batch size is used unless `batch_size` is given.
+        """
+        if batch_size is None:
+            return self._col.aggregate(pipeline)
+        return self._col.aggregate(pipeline, batchSize=batch_size)
+
+    def find(
+        self, filter: dict[str, Any], projection: Optional[dict[str, Any]] = None
+    ) -> "ExtendedCursor":
         """
         See `Collection.find()` for information.
 
         Note that this method returns a `ExtendedCursor` object instead of a `Cursor` object.
         """
-        return ExtendedCursor(self._col, filter)
+        return ExtendedCursor(self._col, filter, projection)
+
+    def find_raw(
+        self, filter: dict[str, Any], projection: Optional[dict[str, Any]] = None
+    ) -> Cursor:
+        """
+        See `Collection.find()` for information.
 
-    def find_one(self, filter: dict[str, Any]) -> Optional[dict[str, Any]]:
+        Unlike `find()`, this method returns the plain pymongo `Cursor`.
+        Use it for read-only queries that are simply iterated once, without chaining options onto the cursor.
+        """
+        return self._col.find(filter, projection)
+
+    def find_one(
+        self, filter: dict[str, Any], projection: Optional[dict[str, Any]] = None
+    ) -> Optional[dict[str, Any]]:
         """
         See `Collection.find_one()` for information.
 
-        Note that this method returns a dictionary instead of a `Document` object.
+        Note that this method returns None instead of an empty document.
+        The result is returned as is, since pymongo already decodes documents into plain dictionaries.
+        """
+        result = self._col.find_one(filter, projection)
+        return result if result else None
+
+    def find_one_fields(self, filter: dict[str, Any], *fields: str) -> Optional[dict[str, Any]]:
+        """
+        Like `find_one()`, but only the given fields are returned, without `_id`.
+
+        Example usage:
+        ```
+        find_one_fields({"email": email}, "username", "password")
+        ```
         """
-        result = self._col.find_one(filter)
-        return dict(result) if result else None
+        projection = dict.fromkeys(fields, 1)
+        projection["_id"] = 0
+        return self._col.find_one(filter, projection)
 
     def exists(self, key: str, value: Any) -> bool:
         """
         Check if a document with a certain value of a key exists in the collection.
+
+        Only the key itself is projected, so the check is served from the index on the key if there is one.
         """
-        return self.find_one({key: value}) is not None
+        return self._col.find_one({key: value}, {key: 1, "_id": 0}) is not None
 
     def update_values(self, filter: dict[str, Any], update: dict[str, Any]) -> None:
         """
@@ -99,6 +247,30 @@ class ExtendedCollection:
         """
         self.update_one(filter=filter, update={"$set": update})
 
+    def find_and_update_values(
+        self,
+        filter: dict[str, Any],
+        update: dict[str, Any],
+        projection: Optional[dict[str, Any]] = None,
+    ) -> Optional[dict[str, Any]]:
+        """
+        Like `update_values()`, but also returns the document as it was before the update, in the same operation.
+        This is a wrapper around `find_one_and_update()`.
+
+        Use `projection` to return only the fields needed. Returns None if no document matches the filter.
+
+        Example usage:
+        ```
+        find_and_update_values(filter={"_id": 123}, update={"age": 26}, projection={"age": 1})
+        ```
+        """
+        return self._col.find_one_and_update(
+            filter,
+            {"$set": update},
+            projection=projection,
+            return_document=ReturnDocument.BEFORE,
+        )
+
     def make_increments(
         self, filter: dict[str, Any], increments: dict[str, int], upsert: bool = False
     ) -> None:
@@ -125,14 +297,19 @@ class ExtendedCursor(Cursor):
     - `sort`
     - `skip`
     - `limit`
+    - `hint`
+    - `batch_size`
     """
 
     def __init__(
-        self, collection: ExtendedCollection, filter: Optional[dict[str, Any]] = None
+        self,
+        collection: ExtendedCollection,
+        filter: Optional[dict[str, Any]] = None,
+        projection: Optional[dict[str, Any]] = None,
     ) -> None:
-        super().__init__(collection, filter)
+        super().__init__(collection, filter, projection)
 
-    def sort(self, key_or_list: Any, direction: int) -> Self:
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> Self:
         """
         See `Cursor.sort()` for information.
         """
@@ -153,18 +330,36 @@ class ExtendedCursor(Cursor):
         super().limit(limit)
         return self
 
+    def hint(self, index: Any) -> Self:
+        """
+        See `Cursor.hint()` for information.
+        """
+        super().hint(index)
+        return self
+
+    def batch_size(self, batch_size: int) -> Self:
+        """
+        See `Cursor.batch_size()` for information.
+        """
+        super().batch_size(batch_size)
+        return self
+
     def as_list(self) -> list[dict[str, Any]]:
         """
         Convert the cursor to a list of documents.
+
+        The documents are fetched in batches, and the first batch holds at most 101 documents unless `batch_size()` says otherwise.
+        A page set with `limit()` up to that size therefore comes back in a single round-trip.
+        For larger results read in full, set `batch_size()` to the expected size to avoid extra `getMore` round-trips.
         """
         self._check_okay_to_chain()
         return list(self)
 
-    def _check_okay_to_chain(self) -> None:
-        """
-        Check if it is okay to chain more options onto this cursor.
-        """
-        return super(ExtendedCursor, self)._check_okay_to_chain()
+
+def _raise_if_duplicate_key(write_errors: list[dict[str, Any]], error: Exception) -> None:
+    for write_error in write_errors:
+        if write_error.get("code") == 11000:
+            raise DuplicateKeyError(write_error.get("errmsg"), 11000, write_error) from error
 
 
 class Database:
@@ -172,75 +367,222 @@ class Database:
     This class combined all mongo databse in this project, and serves all the collections as properties.
 
     Note that the collections are stored as the `ExtendedCollection` class, which provides additional methods for working with MongoDB collections.
+    Each collection is wrapped on first access only.
+
+    The collections use the client's write concern unless `write_concern` is given.
     """
 
-    def __init__(self, client: MongoClient) -> None:
+    __slots__ = ("_client", "_write_concern", "_collections", "_server_features")
+
+    def __init__(
+        self,
+        client: MongoClient,
+        write_concern: Optional[WriteConcern] = None,
+        server_features: Optional[dict[str, bool]] = None,
+    ) -> None:
         self._client = client
-        users_db = client["users"]
-        posts_db = client["posts"]
-        comments_db = client["comments"]
-        project_db = client["projects"]
-        changelog_db = client["changelog"]
-
-        self._user_info = ExtendedCollection(users_db["user-info"])
-        self._user_creds = ExtendedCollection(users_db["user-creds"])
-        self._user_about = ExtendedCollection(users_db["user-about"])
-        self._post_info = ExtendedCollection(posts_db["posts-info"])
-        self._post_content = ExtendedCollection(posts_db["posts-content"])
-        self._comment = ExtendedCollection(comments_db["comment"])
-        self._project_info = ExtendedCollection(project_db["project-info"])
-        self._project_content = ExtendedCollection(project_db["project-content"])
-        self._changelog = ExtendedCollection(changelog_db["changelog-entry"])
+        self._write_concern = write_concern
+        self._collections: dict[tuple[str, str], ExtendedCollection] = {}
+        # filled by `probe_server_features()`, and shared with the handles made by `with_write_concern()`
+        self._server_features = server_features if server_features is not None else {}
+
+    def _collection(self, database: str, collection: str) -> ExtendedCollection:
+        """
+        Wraps the collection on first access, then returns the same `ExtendedCollection` every time.
+        `setdefault()` is atomic, so threads racing on the first access still end up sharing one wrapper.
+        """
+        key = (database, collection)
+        wrapped = self._collections.get(key)
+        if wrapped is None:
+            db = self._client.get_database(database, write_concern=self._write_concern)
+            wrapped = self._collections.setdefault(key, ExtendedCollection(db[collection]))
+        return wrapped
 
     @property
     def client(self) -> MongoClient:
         return self._client
 
+    def with_write_concern(self, **kwargs: Any) -> "Database":
+        """
+        Returns a `Database` on the same client whose collections use the given write concern instead of the default.
+
+        This is meant for writes that don't need to wait for replication, e.g. view counters with `w=1`.
+        Note that `bulk_write()` across collections still uses the client's write concern.
+
+        Example usage:
+        ```
+        mongodb.with_write_concern(w=1).post_info.make_increments(...)
+        ```
+        """
+        return Database(
+            client=self._client,
+            write_concern=WriteConcern(**kwargs),
+            server_features=self._server_features,
+        )
+
+    def probe_server_features(self) -> None:
+        """
+        Asks the server once which of the optional features used here it supports. No return value.
+        Meant to be called when the connection is verified; until then, the features are assumed unsupported.
+
+        - `client_bulk_write`: `MongoClient.bulk_write()`, which needs MongoDB 8.0+ (wire version 25).
+        """
+        hello = self._client.admin.command("hello")
+        self._server_features["client_bulk_write"] = hello.get("maxWireVersion", 0) >= 25
+
+    def bulk_write(self, writes: list[tuple[ExtendedCollection, WriteOperation]]) -> None:
+        """
+        Sends write operations on several collections to the server in one round-trip with `MongoClient.bulk_write()`.
+        Each operation is paired with its target collection, and should be created with `namespace=collection.namespace`.
+
+        `MongoClient.bulk_write()` requires MongoDB 8.0+, which is checked once by `probe_server_features()`.
+        On older servers, consecutive operations on the same collection are sent together
+        with `Collection.bulk_write()`, one round-trip per run of operations, in the same order.
+
+        The operations are ordered, so nothing after a failed operation is written.
+        If it failed on a unique index, `DuplicateKeyError` is raised as it would be by `insert_one()`.
+
+        Example usage:
+        ```
+        bulk_write([(db.post_info, InsertOne(info, namespace=db.post_info.namespace))])
+        ```
+        """
+        if self._server_features.get("client_bulk_write", False):
+            try:
+                self._client.bulk_write([operation for _, operation in writes])
+            except ClientBulkWriteException as e:
+                _raise_if_duplicate_key(e.write_errors or [], e)
+                raise
+            return
+
+        try:
+            for collection, run in groupby(writes, key=itemgetter(0)):
+                collection.bulk_write([operation for _, operation in run])
+        except BulkWriteError as e:
+            _raise_if_duplicate_key(e.details.get("writeErrors", []), e)
+            raise
+
     @property
     def user_info(self) -> ExtendedCollection:
-        return self._user_info
+        return self._collection("users", "user-info")
 
     @property
     def user_creds(self) -> ExtendedCollection:
-        return self._user_creds
+        return self._collection("users", "user-creds")
 
     @property
     def user_about(self) -> ExtendedCollection:
-        return self._user_about
+        return self._collection("users", "user-about")
 
     @property
     def post_info(self) -> ExtendedCollection:
-        return self._post_info
+        return self._collection("posts", "posts-info")
 
     @property
     def post_content(self) -> ExtendedCollection:
-        return self._post_content
+        return self._collection("posts", "posts-content")
 
     @property
     def comment(self) -> ExtendedCollection:
-        return self._comment
+        return self._collection("comments", "comment")
 
     @property
     def project_info(self) -> ExtendedCollection:
-        return self._project_info
+        return self._collection("projects", "project-info")
 
     @property
     def project_content(self) -> ExtendedCollection:
-        return self._project_content
+        return self._collection("projects", "project-content")
 
     @property
     def changelog(self) -> ExtendedCollection:
-        return self._changelog
+        return self._collection("changelog", "changelog-entry")
+
+
+# Index backing the changelog list queries, which filter by author and archived status,
+# then sort by creation time
+CHANGELOG_LIST_INDEX = [
+    ("author", ASCENDING),
+    ("archived", ASCENDING),
+    ("created_at", DESCENDING),
+    ("changelog_uid", DESCENDING),
+]
+
+
+# Indexes backing the post and project list queries, which filter by author and archived status,
+# then sort by creation time
+POST_LIST_INDEX = [
+    ("author", ASCENDING),
+    ("archived", ASCENDING),
+    ("created_at", DESCENDING),
+    ("post_uid", DESCENDING),
+]
+PROJECT_LIST_INDEX = [
+    ("author", ASCENDING),
+    ("archived", ASCENDING),
+    ("created_at", DESCENDING),
+    ("project_uid", DESCENDING),
+]
+
+# Index backing the featured posts on the user's home page
+FEATURED_POST_INDEX = [
+    ("author", ASCENDING),
+    ("archived", ASCENDING),
+    ("featured", ASCENDING),
+    ("created_at", DESCENDING),
+]
+
+# Index backing the comments of a post, sorted from the oldest
+COMMENT_LIST_INDEX = [("post_uid", ASCENDING), ("created_at", ASCENDING)]
+
+# Indexes backing the user lookups and `exists()` checks by username or email
+USERNAME_INDEX = [("username", ASCENDING)]
+EMAIL_INDEX = [("email", ASCENDING)]
+
+# Indexes covering the username listings of users with gallery or changelog enabled
+GALLERY_USERNAME_INDEX = [("gallery_enabled", ASCENDING), ("username", ASCENDING)]
+CHANGELOG_USERNAME_INDEX = [("changelog_enabled", ASCENDING), ("username", ASCENDING)]
+
+
+def create_indexes(db_handler: Database) -> None:
+    """
+    Create the indexes backing the most frequent queries. No return value.
+
+    Creating an index that already exists is a no-op, so this is safe to run on every startup.
+    The UID fields are unique, since `UIDGenerator` relies on them to catch duplicates.
+    """
+    db_handler.post_info.create_index([("post_uid", ASCENDING)], unique=True)
+    db_handler.post_info.create_index(POST_LIST_INDEX)
+    db_handler.post_info.create_index(FEATURED_POST_INDEX)
+    db_handler.post_content.create_index([("post_uid", ASCENDING)], unique=True)
+    db_handler.project_info.create_index([("project_uid", ASCENDING)], unique=True)
+    db_handler.project_info.create_index(PROJECT_LIST_INDEX)
+    db_handler.project_content.create_index([("project_uid", ASCENDING)], unique=True)
+    db_handler.comment.create_index([("comment_uid", ASCENDING)], unique=True)
+    db_handler.comment.create_index(COMMENT_LIST_INDEX)
+    db_handler.changelog.create_index([("changelog_uid", ASCENDING)], unique=True)
+    db_handler.changelog.create_index(CHANGELOG_LIST_INDEX)
+    db_handler.user_info.create_index(USERNAME_INDEX)
+    db_handler.user_info.create_index(EMAIL_INDEX)
+    db_handler.user_creds.create_index(USERNAME_INDEX)
+    db_handler.user_creds.create_index(EMAIL_INDEX)
+    db_handler.user_about.create_index(USERNAME_INDEX)
+    db_handler.user_info.create_index(GALLERY_USERNAME_INDEX)
+    db_handler.user_info.create_index(CHANGELOG_USERNAME_INDEX)
+
+
+# Shared database handle backed by one pooled client, reused across requests
+_client = MongoClient(MONGO_URL, maxPoolSize=50, minPoolSize=10)
+mongodb = Database(client=_client)
+atexit.register(_client.close)
 
 
 @contextmanager
-def mongo_connection():
+def mongo_connection() -> Iterator[Database]:
     """
     Context manager for handling MongoDB connections.
+
+    It yields the shared `mongodb` handle, so the connection pool is kept across requests instead of being
+    rebuilt (and the handshakes redone) by every block. The client is closed when the process exits.
     """
-    client = MongoClient(MONGO_URL, maxPoolSize=10, minPoolSize=1)
-    try:
-        mongodb = Database(client=client)
-        yield mongodb
-    finally:
-        client.close()
+    yield mongodb
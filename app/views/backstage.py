@@ -1,16 +1,18 @@
-import io
 import json
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-from bcrypt import checkpw, gensalt, hashpw
 from flask import (
     Blueprint,
     Response,
     flash,
+    g,
     redirect,
     render_template,
     request,
-    send_file,
     session,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user, login_required, logout_user
@@ -26,17 +28,52 @@ from app.forms.users import (
     UpdateSocialLinksForm,
     UserDeletionForm,
 )
-from app.helpers.changelog import ChangelogUtils, create_changelog, update_changelog
-from app.helpers.posts import PostUtils, create_post, update_post
-from app.helpers.projects import ProjectsUtils, create_project, update_project
-from app.helpers.users import UserUtils
-from app.helpers.utils import Paging, slicing_title
+from app.helpers.changelog import (
+    CHANGELOG_LIST_PROJECTION,
+    ChangelogUtils,
+    create_changelog,
+    update_changelog,
+)
+from app.helpers.comments import CommentUtils
+from app.helpers.posts import (
+    POST_EXPORT_PROJECTION,
+    PostUtils,
+    create_post,
+    update_post,
+)
+from app.helpers.projects import (
+    PROJECT_EXPORT_PROJECTION,
+    ProjectsUtils,
+    create_project,
+    update_project,
+)
+from app.helpers.users import (
+    UserUtils,
+    hash_password,
+    user_about_cache,
+    user_info_cache,
+    verify_password,
+)
+from app.helpers.utils import PAGING_COUNT_FIELDS, Paging, slicing_title
 from app.logging import logger, logger_utils
-from app.mongo import mongo_connection
+from app.mongo import Database, ExtendedCollection, mongo_connection
 from app.views.main import flashing_if_errors
 
 backstage = Blueprint("backstage", __name__, template_folder=TEMPLATE_FOLDER)
 
+# independent reads of a panel are sent side by side, as the pymongo client is thread-safe
+_panel_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="panel-query")
+
+
+def _get_user_info(mongodb: Database) -> dict:
+    """
+    Returns the `user_info` document of the current user.
+    It is read once per request and kept in `g`, so views should update it in place after writing to it.
+    """
+    if "user_info" not in g:
+        g.user_info = mongodb.user_info.find_one({"username": current_user.username})
+    return g.user_info
+
 
 @backstage.route("/", methods=["GET"])
 @login_required
@@ -58,14 +95,18 @@ def posts_panel() -> str:
 
     session["last_visited"] = request.base_url
     current_page = request.args.get("page", default=1, type=int)
+    after = request.args.get("after", default=None, type=datetime.fromisoformat)
+    after_uid = request.args.get("after_uid", default=None, type=str)
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         form = NewPostForm()
         if form.validate_on_submit():
             post_uid = create_post(form, mongodb)
             if post_uid is not None:
-                logger.debug(f"User {current_user.username} has published a new post {post_uid}.")
+                logger.debug(
+                    "User %s has published a new post %s.", current_user.username, post_uid
+                )
                 flash("New post published successfully!", category="success")
         flashing_if_errors(form.errors)
 
@@ -76,15 +117,30 @@ def posts_panel() -> str:
             username=current_user.username,
             page_number=current_page,
             posts_per_page=POSTS_EACH_PAGE,
+            after=(after, after_uid) if after and after_uid else None,
+        )
+        comment_counts = CommentUtils(mongodb).count_comments_by_post_uids(
+            [post.get("post_uid") for post in posts]
         )
         for post in posts:
             post["title"] = slicing_title(post.get("title"), 25)
-            post["comments"] = mongodb.comment.count_documents({"post_uid": post.get("post_uid")})
+            post["comments"] = comment_counts.get(post.get("post_uid"), 0)
+
+    # seek cursor for the next page
+    next_cursor = {}
+    if posts:
+        next_cursor["after"] = posts[-1].get("created_at").isoformat()
+        next_cursor["after_uid"] = posts[-1].get("post_uid")
 
     logger_utils.pagination(request, current_page, len(posts))
 
     return render_template(
-        "backstage/posts.html", user=user, posts=posts, pagination=pagination, form=form
+        "backstage/posts.html",
+        user=user,
+        posts=posts,
+        pagination=pagination,
+        form=form,
+        next_cursor=next_cursor,
     )
 
 
@@ -99,6 +155,8 @@ def projects_panel() -> str:
 
     session["last_visited"] = request.base_url
     current_page = request.args.get("page", default=1, type=int)
+    after = request.args.get("after", default=None, type=datetime.fromisoformat)
+    after_uid = request.args.get("after_uid", default=None, type=str)
 
     with mongo_connection() as mongodb:
         form = NewProjectForm()
@@ -106,25 +164,39 @@ def projects_panel() -> str:
             project_uid = create_project(form, mongodb)
             if project_uid is not None:
                 logger.info(
-                    f"User {current_user.username} has published a new project {project_uid}."
+                    "User %s has published a new project %s.", current_user.username, project_uid
                 )
                 flash("New project published successfully!", category="success")
         flashing_if_errors(form.errors)
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         projects_utils = ProjectsUtils(mongodb)
         projects = projects_utils.get_project_infos_with_pagination(
-            current_user.username, current_page, PROJECTS_PER_PAGE
+            current_user.username,
+            current_page,
+            PROJECTS_PER_PAGE,
+            after=(after, after_uid) if after and after_uid else None,
         )
         paging = Paging(mongodb)
         paging.setup(current_user.username, "project", current_page, PROJECTS_PER_PAGE)
 
+    # seek cursor for the next page
+    next_cursor = {}
+    if projects:
+        next_cursor["after"] = projects[-1].get("created_at").isoformat()
+        next_cursor["after_uid"] = projects[-1].get("project_uid")
+
     for project in projects:
         project["title"] = slicing_title(project.get("title"), 40)
 
     logger_utils.pagination(request, current_page, len(projects))
 
     return render_template(
-        "backstage/projects.html", user=user, projects=projects, pagination=paging, form=form
+        "backstage/projects.html",
+        user=user,
+        projects=projects,
+        pagination=paging,
+        form=form,
+        next_cursor=next_cursor,
     )
 
 
@@ -137,16 +209,32 @@ def archive_panel() -> str:
     session["last_visited"] = request.base_url
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        # the reads don't depend on each other, so they are sent at the same time
+        username = current_user.username
         post_utils = PostUtils(mongodb)
-        posts = post_utils.get_post_infos(current_user.username, archive="only")
-        for post in posts:
-            post["views"] = format(post.get("views"), ",")
-            post["comments"] = mongodb.comment.count_documents({"post_uid": post.get("post_uid")})
         projects_utils = ProjectsUtils(mongodb)
-        projects = projects_utils.get_project_infos(current_user.username, archive="only")
         changelog_utils = ChangelogUtils(mongodb)
-        changelogs = changelog_utils.get_archived_changelogs(current_user.username)
+        posts_future = _panel_query_executor.submit(
+            post_utils.get_post_infos, username, archive="only"
+        )
+        projects_future = _panel_query_executor.submit(
+            projects_utils.get_project_infos, username, archive="only"
+        )
+        changelogs_future = _panel_query_executor.submit(
+            changelog_utils.get_archived_changelogs, username, projection=CHANGELOG_LIST_PROJECTION
+        )
+
+        # read in this thread meanwhile, as `g` belongs to the request
+        user = _get_user_info(mongodb)
+        posts = posts_future.result()
+        comment_counts = CommentUtils(mongodb).count_comments_by_post_uids(
+            [post.get("post_uid") for post in posts]
+        )
+        for post in posts:
+            post["views"] = format(post.get("views"), ",")
+            post["comments"] = comment_counts.get(post.get("post_uid"), 0)
+        projects = projects_future.result()
+        changelogs = changelogs_future.result()
 
     logger_utils.pagination(request, 1, len(posts) + len(projects))
 
@@ -166,6 +254,8 @@ def changelog_panel() -> str:
 
     session["last_visited"] = request.base_url
     current_page = request.args.get("page", default=1, type=int)
+    after = request.args.get("after", default=None, type=datetime.fromisoformat)
+    after_uid = request.args.get("after_uid", default=None, type=str)
 
     with mongo_connection() as mongodb:
         form = NewChangelogForm()
@@ -173,26 +263,43 @@ def changelog_panel() -> str:
             changelog_uid = create_changelog(form, mongodb)
             if changelog_uid is not None:
                 logger.info(
-                    f"User {current_user.username} has published a new changelog {changelog_uid}."
+                    "User %s has published a new changelog %s.",
+                    current_user.username,
+                    changelog_uid,
                 )
                 flash("New changelog published successfully!", category="success")
         flashing_if_errors(form.errors)
 
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         changelog_utils = ChangelogUtils(mongodb)
         changelogs = changelog_utils.get_changelogs_with_pagination(
-            current_user.username, current_page, CHANGELOGS_PER_PAGE
+            current_user.username,
+            current_page,
+            CHANGELOGS_PER_PAGE,
+            after=(after, after_uid) if after and after_uid else None,
+            projection=CHANGELOG_LIST_PROJECTION,
         )
         paging = Paging(mongodb)
         paging.setup(current_user.username, "changelog", current_page, CHANGELOGS_PER_PAGE)
 
+    # seek cursor for the next page
+    next_cursor = {}
+    if changelogs:
+        next_cursor["after"] = changelogs[-1].get("created_at").isoformat()
+        next_cursor["after_uid"] = changelogs[-1].get("changelog_uid")
+
     for changelog in changelogs:
         changelog["title"] = slicing_title(changelog.get("title"), 40)
 
     logger_utils.pagination(request, current_page, len(changelogs))
 
     return render_template(
-        "backstage/changelog.html", user=user, form=form, pagination=paging, changelogs=changelogs
+        "backstage/changelog.html",
+        user=user,
+        form=form,
+        pagination=paging,
+        changelogs=changelogs,
+        next_cursor=next_cursor,
     )
 
 
@@ -205,7 +312,7 @@ def theme_panel() -> str:
     session["last_visited"] = request.base_url
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
 
     return render_template("backstage/theme.html", user=user)
 
@@ -225,7 +332,7 @@ def settings_panel() -> str:
     session["last_visited"] = request.base_url
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         form_general = GeneralSettingsForm(prefix="general")
         form_social = UpdateSocialLinksForm(prefix="social")
         form_update_pw = UpdatePasswordForm(prefix="pw")
@@ -246,9 +353,15 @@ def settings_panel() -> str:
                     "changelog_enabled": form_general.changelog_enabled.data,
                 },
             )
-            logger.info(f"User {current_user.username} has updated his/her general settings.")
+            user_info_cache.invalidate(current_user.username)
+            logger.info("User %s has updated his/her general settings.", current_user.username)
             flash("Update succeeded!", category="success")
-            user = mongodb.user_info.find_one({"username": current_user.username})
+            user.update(
+                cover_url=cover_url,
+                blogname=form_general.blogname.data,
+                gallery_enabled=form_general.gallery_enabled.data,
+                changelog_enabled=form_general.changelog_enabled.data,
+            )
 
         if request.method == "GET":
             for i in range(len(user.get("social_links"))):
@@ -258,9 +371,10 @@ def settings_panel() -> str:
 
         if form_social.submit_links.data and form_social.validate_on_submit():
             updated_links = []
+            social_data = form_social.data
             for i in range(5):
-                url = form_social.data.get(f"url{i}", "")
-                platform = form_social.data.get(f"platform{i}", "")
+                url = social_data.get(f"url{i}", "")
+                platform = social_data.get(f"platform{i}", "")
                 if url and platform:
                     updated_links.append((url, platform))
             while len(updated_links) < 5:
@@ -270,16 +384,17 @@ def settings_panel() -> str:
                 filter={"username": current_user.username},
                 update={"social_links": updated_links},
             )
-            logger.info(f"User {current_user.username} has updated his/her social links.")
+            user_info_cache.invalidate(current_user.username)
+            logger.info("User %s has updated his/her social links.", current_user.username)
             flash("Social Links updated!", category="success")
-            user = mongodb.user_info.find_one({"username": current_user.username})
+            user["social_links"] = updated_links
 
         if form_update_pw.submit_pw.data and form_update_pw.validate_on_submit():
             current_pw = form_update_pw.current_pw.data
-            current_pw_encoded = current_pw.encode("utf-8")
-            user_creds = mongodb.user_creds.find_one({"username": current_user.username})
-            real_pw_encoded = user_creds.get("password").encode("utf-8")
-            if not checkpw(current_pw_encoded, real_pw_encoded):
+            user_creds = mongodb.user_creds.find_one_fields(
+                {"username": current_user.username}, "password"
+            )
+            if not verify_password(current_pw, user_creds.get("password")):
                 flash("Invalid current password. Please try again.", category="error")
                 return render_template(
                     "backstage/settings.html",
@@ -291,12 +406,13 @@ def settings_panel() -> str:
                 )
 
             new_pw = form_update_pw.new_pw.data
-            new_pw_hashed = hashpw(new_pw.encode("utf-8"), gensalt(12)).decode("utf-8")
+            new_pw_hashed = hash_password(new_pw)
             mongodb.user_creds.update_values(
                 filter={"username": current_user.username},
                 update={"password": new_pw_hashed},
             )
-            logger.info(f"User {current_user.username} has updated his/her password.")
+            logger.info("User %s has updated his/her password.", current_user.username)
+            user_info_cache.invalidate(current_user.username)
             logout_user()
             logger_utils.logout(request=request, username=current_user.username)
             session.clear()
@@ -306,11 +422,11 @@ def settings_panel() -> str:
 
         if form_deletion.submit_delete.data and form_deletion.validate_on_submit():
             pw = form_deletion.password.data
-            pw_encoded = pw.encode("utf-8")
-            user_creds = mongodb.user_creds.find_one({"username": current_user.username})
-            real_pw_encoded = user_creds.get("password").encode("utf-8")
+            user_creds = mongodb.user_creds.find_one_fields(
+                {"username": current_user.username}, "password"
+            )
 
-            if not checkpw(pw_encoded, real_pw_encoded):
+            if not verify_password(pw, user_creds.get("password")):
                 flash("Invalid password. Access denied.", category="error")
                 return render_template(
                     "backstage/settings.html",
@@ -324,12 +440,13 @@ def settings_panel() -> str:
             # Deletion procedure
             username = current_user.username
             logout_user()
+            user_info_cache.invalidate(username)
             logger_utils.logout(request=request, username=username)
             session.clear()
             user_utils = UserUtils(mongodb)
             user_utils.delete_user(username, logger)
             flash("Account deleted successfully!", category="success")
-            logger.info(f"User {username} has been deleted.")
+            logger.info("User %s has been deleted.", username)
             return redirect(url_for("main.signup"))
 
     flashing_if_errors(form_general.errors)
@@ -354,8 +471,10 @@ def about_panel() -> str:
     The panel to edit user about, which includes the user profile image, short bio, and about section.
     """
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
-        about = mongodb.user_about.find_one({"username": current_user.username}).get("about")
+        user = _get_user_info(mongodb)
+        about = mongodb.user_about.find_one_fields(
+            {"username": current_user.username}, "about"
+        ).get("about")
 
         form = EditAboutForm()
         if form.validate_on_submit():
@@ -375,8 +494,11 @@ def about_panel() -> str:
             mongodb.user_about.update_values(
                 filter={"username": user.get("username")}, update=updated_about
             )
+            user.update(updated_info)
             about = updated_about.get("about")
-            logger.info(f"User {current_user.username} has updated his/her about page.")
+            user_info_cache.invalidate(current_user.username)
+            user_about_cache.invalidate(current_user.username)
+            logger.info("User %s has updated his/her about page.", current_user.username)
             flash("Information updated!", category="success")
         flashing_if_errors(form.errors)
 
@@ -397,13 +519,13 @@ def edit_post(post_uid: str) -> str:
         form = EditPostForm()
         if form.validate_on_submit():
             update_post(post_uid, form, mongodb)
-            logger.info(f"User {current_user.username} has updated project {post_uid}.")
-            title = mongodb.post_info.find_one({"post_uid": post_uid}).get("title")
+            logger.info("User %s has updated project %s.", current_user.username, post_uid)
+            title = mongodb.post_info.find_one_fields({"post_uid": post_uid}, "title").get("title")
             title_sliced = slicing_title(title, max_len=20)
             flash(f'Your post "{title_sliced}" has been updated!', category="success")
         flashing_if_errors(form.errors)
 
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         post_utils = PostUtils(mongodb)
         post = post_utils.get_full_post(post_uid)
         post["tags"] = ", ".join(post.get("tags"))
@@ -422,7 +544,7 @@ def edit_project(project_uid: str) -> str:
     session["last_visited"] = request.base_url
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         projects_utils = ProjectsUtils(mongodb)
         project = projects_utils.get_full_project(project_uid)
         project["tags"] = ", ".join(project.get("tags"))
@@ -430,9 +552,11 @@ def edit_project(project_uid: str) -> str:
         form = EditProjectForm()
         if form.validate_on_submit():
             update_project(project_uid, form, mongodb)
-            logger.info(f"User {current_user.username} has updated project {project_uid}.")
+            logger.info("User %s has updated project %s.", current_user.username, project_uid)
             title_sliced = slicing_title(
-                mongodb.project_info.find_one({"project_uid": project_uid}).get("title"),
+                mongodb.project_info.find_one_fields({"project_uid": project_uid}, "title").get(
+                    "title"
+                ),
                 max_len=20,
             )
             flash(f'Your project "{title_sliced}" has been updated!', category="success")
@@ -454,7 +578,7 @@ def edit_changelog(changelog_uid: str) -> str:
     session["last_visited"] = request.base_url
 
     with mongo_connection() as mongodb:
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        user = _get_user_info(mongodb)
         changelog = mongodb.changelog.find_one({"changelog_uid": changelog_uid})
         changelog["date"] = changelog.get("date").strftime("%m/%d/%Y")
         changelog["tags"] = ", ".join(changelog.get("tags"))
@@ -462,9 +586,11 @@ def edit_changelog(changelog_uid: str) -> str:
         form = EditChangelogForm()
         if form.validate_on_submit():
             update_changelog(changelog_uid, form, mongodb)
-            logger.info(f"User {current_user.username} has updated project {changelog_uid}.")
+            logger.info("User %s has updated project %s.", current_user.username, changelog_uid)
             title_sliced = slicing_title(
-                mongodb.changelog.find_one({"changelog_uid": changelog_uid}).get("title"),
+                mongodb.changelog.find_one_fields({"changelog_uid": changelog_uid}, "title").get(
+                    "title"
+                ),
                 max_len=20,
             )
             flash(f'Your changelog "{title_sliced}" has been updated!', category="success")
@@ -495,14 +621,14 @@ def toggle_featured() -> Response:
 
         if request.args.get("featured") == "to_true":
             updated_featured_status = True
-            logger.info(f"User {current_user.username} has set a featured post {post_uid}.")
+            logger.info("User %s has set a featured post %s.", current_user.username, post_uid)
             flash(
                 f'Your post "{truncated_post_title}" is now featured on the home page!',
                 category="success",
             )
         else:
             updated_featured_status = False
-            logger.info(f"User {current_user.username} has unset a featured post {post_uid}.")
+            logger.info("User %s has unset a featured post %s.", current_user.username, post_uid)
             flash(
                 f'Your post "{truncated_post_title}" is now removed from the home page!',
                 category="success",
@@ -515,6 +641,33 @@ def toggle_featured() -> Response:
     return redirect(url_for("backstage.posts_panel"))
 
 
+def _update_archived(collection: ExtendedCollection, filter: dict, archived: bool) -> bool:
+    """
+    Sets the archived status of the entry matching `filter`.
+
+    Returns:
+        bool: True if the status was changed, False if the entry already had it.
+    """
+    previous = collection.find_and_update_values(
+        filter={**filter, "archived": not archived},
+        update={"archived": archived},
+        projection={"_id": 1},
+    )
+    return previous is not None
+
+
+def _increment_paging_count(mongodb: Database, username: str, content: str, archived: bool) -> None:
+    """
+    Adjusts the user's count of non-archived entries after an entry is archived or restored.
+    Deleting a non-archived entry counts as archiving it. No return value.
+    """
+    mongodb.user_info.make_increments(
+        filter={"username": username},
+        increments={PAGING_COUNT_FIELDS[content]: -1 if archived else 1},
+    )
+    user_info_cache.invalidate(username)
+
+
 @backstage.route("/edit-archived", methods=["GET"])
 @login_required
 def toggle_archived() -> Response:
@@ -536,24 +689,26 @@ def toggle_archived() -> Response:
 
             if request.args.get("archived") == "to_true":
                 updated_archived_status = True
-                logger.info(f"User {current_user.username} has archived a post {post_uid}.")
-                tags_increment = {f"tags.{tag}": -1 for tag in tags}
+                logger.info("User %s has archived a post %s.", current_user.username, post_uid)
+                increments = {f"tags.{tag}": -1 for tag in tags}
+                increments[PAGING_COUNT_FIELDS["post"]] = -1
                 flash(f'Your post "{title_sliced}" is now archived!', category="success")
             else:
                 updated_archived_status = False
-                logger.info(f"User {current_user.username} has restored a post {post_uid}.")
-                tags_increment = {f"tags.{tag}": 1 for tag in tags}
+                logger.info("User %s has restored a post %s.", current_user.username, post_uid)
+                increments = {f"tags.{tag}": 1 for tag in tags}
+                increments[PAGING_COUNT_FIELDS["post"]] = 1
                 flash(
                     f'Your post "{title_sliced}" is now restored from the archive!',
                     category="success",
                 )
 
-            mongodb.post_info.update_values(
-                filter={"post_uid": post_uid}, update={"archived": updated_archived_status}
-            )
-            mongodb.user_info.make_increments(
-                filter={"username": author}, increments=tags_increment, upsert=True
-            )
+            # the counts only change if the post wasn't in the requested state already
+            if _update_archived(mongodb.post_info, {"post_uid": post_uid}, updated_archived_status):
+                mongodb.user_info.make_increments(
+                    filter={"username": author}, increments=increments, upsert=True
+                )
+                user_info_cache.invalidate(author)
 
         elif content == "project":
             project_uid = request.args.get("uid")
@@ -562,20 +717,26 @@ def toggle_archived() -> Response:
 
             if request.args.get("archived") == "to_true":
                 updated_archived_status = True
-                logger.info(f"User {current_user.username} has archived a project {project_uid}.")
+                logger.info(
+                    "User %s has archived a project %s.", current_user.username, project_uid
+                )
                 flash(f'Your project "{title_sliced}" is now archived!', category="success")
             else:
                 updated_archived_status = False
-                logger.info(f"User {current_user.username} has restored a project {project_uid}.")
+                logger.info(
+                    "User %s has restored a project %s.", current_user.username, project_uid
+                )
                 flash(
                     f'Your project "{title_sliced}" is now restored from the archive!',
                     category="success",
                 )
 
-            mongodb.project_info.update_values(
-                filter={"project_uid": project_uid},
-                update={"archived": updated_archived_status},
-            )
+            if _update_archived(
+                mongodb.project_info, {"project_uid": project_uid}, updated_archived_status
+            ):
+                _increment_paging_count(
+                    mongodb, project_info.get("author"), "project", updated_archived_status
+                )
 
         elif content == "changelog":
             changelog_uid = request.args.get("uid")
@@ -585,23 +746,25 @@ def toggle_archived() -> Response:
             if request.args.get("archived") == "to_true":
                 updated_archived_status = True
                 logger.info(
-                    f"User {current_user.username} has archived a changelog {changelog_uid}."
+                    "User %s has archived a changelog %s.", current_user.username, changelog_uid
                 )
                 flash(f'Your changelog "{title_sliced}" is now archived!', category="success")
             else:
                 updated_archived_status = False
                 logger.info(
-                    f"User {current_user.username} has restored a changelog {changelog_uid}."
+                    "User %s has restored a changelog %s.", current_user.username, changelog_uid
                 )
                 flash(
                     f'Your changelog "{title_sliced}" is now restored from the archive!',
                     category="success",
                 )
 
-            mongodb.changelog.update_values(
-                filter={"changelog_uid": changelog_uid},
-                update={"archived": updated_archived_status},
-            )
+            if _update_archived(
+                mongodb.changelog, {"changelog_uid": changelog_uid}, updated_archived_status
+            ):
+                _increment_paging_count(
+                    mongodb, changelog.get("author"), "changelog", updated_archived_status
+                )
 
     # redirect mapping
     last_visited = session["last_visited"]
@@ -628,7 +791,10 @@ def delete_post() -> Response:
         title_sliced = slicing_title(post_info.get("title"), max_len=20)
         mongodb.post_info.delete_one({"post_uid": post_uid})
         mongodb.post_content.delete_one({"post_uid": post_uid})
-    logger.info(f"User {current_user.username} has deleted a post {post_uid}.")
+        if not post_info.get("archived"):
+            _increment_paging_count(mongodb, current_user.username, "post", archived=True)
+    user_info_cache.invalidate(current_user.username)
+    logger.info("User %s has deleted a post %s.", current_user.username, post_uid)
     flash(f'Your post "{title_sliced}" has been deleted!', category="success")
 
     return redirect(url_for("backstage.archive_panel"))
@@ -647,7 +813,10 @@ def delete_project() -> Response:
         title_sliced = slicing_title(project_info.get("title"), max_len=20)
         mongodb.project_info.delete_one({"project_uid": project_uid})
         mongodb.project_content.delete_one({"project_uid": project_uid})
-    logger.info(f"User {current_user.username} has deleted a project {project_uid}.")
+        if not project_info.get("archived"):
+            _increment_paging_count(mongodb, current_user.username, "project", archived=True)
+    user_info_cache.invalidate(current_user.username)
+    logger.info("User %s has deleted a project %s.", current_user.username, project_uid)
     flash(f'Your project "{title_sliced}" has been deleted!', category="success")
 
     return redirect(url_for("backstage.archive_panel"))
@@ -665,7 +834,9 @@ def delete_changelog() -> Response:
         changelog = mongodb.changelog.find_one({"changelog_uid": changelog_uid})
         title_sliced = slicing_title(changelog.get("title"), max_len=20)
         mongodb.changelog.delete_one({"changelog_uid": changelog_uid})
-    logger.info(f"User {current_user.username} has deleted a changelog {changelog_uid}.")
+        if not changelog.get("archived"):
+            _increment_paging_count(mongodb, current_user.username, "changelog", archived=True)
+    logger.info("User %s has deleted a changelog %s.", current_user.username, changelog_uid)
     flash(f'Your changelog "{title_sliced}" has been deleted!', category="success")
 
     return redirect(url_for("backstage.archive_panel"))
@@ -673,126 +844,116 @@ def delete_changelog() -> Response:
 
 @backstage.route("/export", methods=["GET"])
 @login_required
-def export_data():
+def export_data() -> Response:
     """
-    Exports user data in JSON format, then serves it as a downloadable file.
+    Exports user data as newline-delimited JSON, then serves it as a downloadable file.
+
+    The first line holds the user information, followed by one line per post, project, and changelog.
+    Each line has a `type` field telling which one it is.
+    The lines are streamed as the documents are read, so the export is never held in memory as a whole.
     """
-    result = {}
+    username = current_user.username
 
-    with mongo_connection() as mongodb:
-        # export user data
-        user_data = {}
-        user_utils = UserUtils(mongodb)
-        user_info = user_utils.get_user_info(current_user.username)
-        user_about = user_utils.get_user_about(current_user.username)
-        user_data["username"] = user_info.username
-        user_data["email"] = user_info.email
-        user_data["blogname"] = user_info.blogname
-        if "static" in user_info.profile_img_url:
-            user_data["profile_img_url"] = ""
-        else:
-            user_data["profile_img_url"] = user_info.profile_img_url
-        if "static" in user_info.cover_url:
-            user_data["cover_url"] = ""
-        else:
-            user_data["cover_url"] = user_info.cover_url
-        user_data["created_at"] = f"{user_info.created_at}"
-        user_data["short_bio"] = user_info.short_bio
-        user_data["about"] = user_about.about
-        i = 0
-        while user_info.social_links[i]:
-            user_data[f"social_link_{i}"] = (
-                user_info.social_links[i][0],
-                user_info.social_links[i][1],
-            )
-            i += 1
-        user_data["total_views"] = user_info.total_views
-        result["info"] = user_data
+    def to_line(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
 
-        # export posts
-        post_data = {}
-        post_utils = PostUtils(mongodb)
-        posts = post_utils.get_post_infos(current_user.username, archive="include")
-        for post in posts:
-            uid = post.get("post_uid")
-            post_data[uid] = {}
-            post_data[uid]["title"] = post.get("title")
-            post_data[uid]["subtitle"] = post.get("subtitle")
-            post_data[uid]["author"] = post.get("author")
-            post_data[uid]["content"] = mongodb.post_content.find_one({"post_uid": uid}).get(
-                "content"
-            )
-            post_data[uid]["tags"] = post.get("tags")
-            post_data[uid]["cover_url"] = post.get("cover_url")
-            post_data[uid]["custom_slug"] = post.get("custom_slug")
-            post_data[uid]["created_at"] = f"{post.get('created_at')}"
-            post_data[uid]["last_updated"] = f"{post.get('last_updated')}"
-            post_data[uid]["archived"] = post.get("archived")
-            post_data[uid]["featured"] = post.get("featured")
-            post_data[uid]["views"] = post.get("views")
-            post_data[uid]["reads"] = post.get("reads")
-        result["posts"] = post_data
-
-        # export projects
-        if user_info.gallery_enabled:
-            project_data = {}
-            projects_utils = ProjectsUtils(mongodb)
-            projects = projects_utils.get_project_infos(current_user.username, archive="include")
-            for project in projects:
-                uid = project.get("project_uid")
-                project_data[uid] = {}
-                project_data[uid]["author"] = project.get("author")
-                project_data[uid]["title"] = project.get("title")
-                project_data[uid]["short_description"] = project.get("short_description")
-                project_data[uid]["content"] = mongodb.project_content.find_one(
-                    {"project_uid": uid}
-                ).get("content")
-                project_data[uid]["tags"] = project.get("tags")
-                project_data[uid]["custom_slug"] = project.get("custom_slug")
-                i = 0
-                while project.get("images")[i]:
-                    project_data[uid][f"image_{i}"] = (
-                        project.get("images")[i][0],
-                        project.get("images")[i][1],
-                    )
-                    i += 1
-                project_data[uid]["created_at"] = f"{project.get('created_at')}"
-                project_data[uid]["last_updated"] = f"{project.get('last_updated')}"
-                project_data[uid]["archived"] = project.get("archived")
-                project_data[uid]["views"] = project.get("views")
-                project_data[uid]["reads"] = project.get("reads")
-            result["projects"] = project_data
-
-        # export changelogs
-        if user_info.changelog_enabled:
-            changelog_data = {}
-            changelog_utils = ChangelogUtils(mongodb)
-            changelogs = changelog_utils.get_changelogs(current_user.username)
-            for changelog in changelogs:
-                uid = changelog.get("changelog_uid")
-                changelog_data[uid] = {}
-                changelog_data[uid]["author"] = changelog.get("author")
-                changelog_data[uid]["title"] = changelog.get("title")
-                changelog_data[uid]["date"] = changelog.get("date")
-                changelog_data[uid]["category"] = changelog.get("category")
-                changelog_data[uid]["content"] = changelog.get("content")
-                changelog_data[uid]["tags"] = changelog.get("tags")
-                changelog_data[uid]["link"] = changelog.get("link")
-                changelog_data[uid]["link_description"] = changelog.get("link_description")
-                changelog_data[uid]["created_at"] = f"{changelog.get('created_at')}"
-                changelog_data[uid]["last_updated"] = f"{changelog.get('last_updated')}"
-                changelog_data[uid]["archived"] = changelog.get("archived")
-            result["changelogs"] = changelog_data
-
-    json_data = json.dumps(result, indent=4, ensure_ascii=False)
-
-    # Create a virtual file to serve as a download
-    buffer = io.BytesIO()
-    buffer.write(json_data.encode("utf-8"))
-    buffer.seek(0)
-
-    # Serve the JSON file as an attachment
-    file_name = f"{current_user.username}_data.json"
-    return send_file(
-        buffer, mimetype="application/json", as_attachment=True, download_name=file_name
+    def generate() -> Iterator[str]:
+        with mongo_connection() as mongodb:
+            # export user data
+            user_data = {"type": "info"}
+            user_utils = UserUtils(mongodb)
+            user_info = user_utils.get_user_info(username)
+            user_about = user_utils.get_user_about(username)
+            user_data["username"] = user_info.username
+            user_data["email"] = user_info.email
+            user_data["blogname"] = user_info.blogname
+            if "static" in user_info.profile_img_url:
+                user_data["profile_img_url"] = ""
+            else:
+                user_data["profile_img_url"] = user_info.profile_img_url
+            if "static" in user_info.cover_url:
+                user_data["cover_url"] = ""
+            else:
+                user_data["cover_url"] = user_info.cover_url
+            user_data["created_at"] = f"{user_info.created_at}"
+            user_data["short_bio"] = user_info.short_bio
+            user_data["about"] = user_about.about
+            for i, link in enumerate(user_info.social_links):
+                if not link:
+                    break
+                user_data[f"social_link_{i}"] = (link[0], link[1])
+            user_data["total_views"] = user_info.total_views
+            yield to_line(user_data)
+
+            # export posts
+            post_utils = PostUtils(mongodb)
+            for post in post_utils.iter_post_infos_with_content(
+                username, projection=POST_EXPORT_PROJECTION
+            ):
+                post_data = {"type": "post", "post_uid": post.get("post_uid")}
+                post_data["title"] = post.get("title")
+                post_data["subtitle"] = post.get("subtitle")
+                post_data["author"] = post.get("author")
+                post_data["content"] = post.get("content", "")
+                post_data["tags"] = post.get("tags")
+                post_data["cover_url"] = post.get("cover_url")
+                post_data["custom_slug"] = post.get("custom_slug")
+                post_data["created_at"] = f"{post.get('created_at')}"
+                post_data["last_updated"] = f"{post.get('last_updated')}"
+                post_data["archived"] = post.get("archived")
+                post_data["featured"] = post.get("featured")
+                post_data["views"] = post.get("views")
+                post_data["reads"] = post.get("reads")
+                yield to_line(post_data)
+
+            # export projects
+            if user_info.gallery_enabled:
+                projects_utils = ProjectsUtils(mongodb)
+                for project in projects_utils.iter_project_infos_with_content(
+                    username, projection=PROJECT_EXPORT_PROJECTION
+                ):
+                    project_data = {"type": "project", "project_uid": project.get("project_uid")}
+                    project_data["author"] = project.get("author")
+                    project_data["title"] = project.get("title")
+                    project_data["short_description"] = project.get("short_description")
+                    project_data["content"] = project.get("content", "")
+                    project_data["tags"] = project.get("tags")
+                    project_data["custom_slug"] = project.get("custom_slug")
+                    for i, image in enumerate(project.get("images", [])):
+                        if image:
+                            project_data[f"image_{i}"] = (image[0], image[1])
+                    project_data["created_at"] = f"{project.get('created_at')}"
+                    project_data["last_updated"] = f"{project.get('last_updated')}"
+                    project_data["archived"] = project.get("archived")
+                    project_data["views"] = project.get("views")
+                    project_data["reads"] = project.get("reads")
+                    yield to_line(project_data)
+
+            # export changelogs
+            if user_info.changelog_enabled:
+                changelog_utils = ChangelogUtils(mongodb)
+                for changelog in changelog_utils.get_changelogs(username):
+                    changelog_data = {
+                        "type": "changelog",
+                        "changelog_uid": changelog.get("changelog_uid"),
+                    }
+                    changelog_data["author"] = changelog.get("author")
+                    changelog_data["title"] = changelog.get("title")
+                    changelog_data["date"] = f"{changelog.get('date')}"
+                    changelog_data["category"] = changelog.get("category")
+                    changelog_data["content"] = changelog.get("content")
+                    changelog_data["tags"] = changelog.get("tags")
+                    changelog_data["link"] = changelog.get("link")
+                    changelog_data["link_description"] = changelog.get("link_description")
+                    changelog_data["created_at"] = f"{changelog.get('created_at')}"
+                    changelog_data["last_updated"] = f"{changelog.get('last_updated')}"
+                    changelog_data["archived"] = changelog.get("archived")
+                    yield to_line(changelog_data)
+
+    # Serve the lines as an attachment while they are generated
+    file_name = f"{username}_data.ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={file_name}"},
     )
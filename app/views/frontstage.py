@@ -1,3 +1,4 @@
+from datetime import datetime
 from urllib.parse import unquote
 
 import readtime
@@ -19,8 +20,8 @@ from app.config import TEMPLATE_FOLDER
 from app.forms.comments import CommentForm
 from app.helpers.changelog import ChangelogUtils
 from app.helpers.comments import CommentUtils, create_comment
-from app.helpers.posts import PostUtils
-from app.helpers.projects import ProjectsUtils
+from app.helpers.posts import POST_SUMMARY_PROJECTION, PostUtils
+from app.helpers.projects import PROJECT_SUMMARY_PROJECTION, ProjectsUtils
 from app.helpers.users import UserUtils
 from app.helpers.utils import (
     Paging,
@@ -47,7 +48,7 @@ def home(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
 
         user = mongodb.user_info.find_one({"username": username})
@@ -73,16 +74,21 @@ def blog(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
 
         current_page = request.args.get("page", default=1, type=int)
+        after = request.args.get("after", default=None, type=datetime.fromisoformat)
+        after_uid = request.args.get("after_uid", default=None, type=str)
         paging = Paging(mongodb)
         pagination = paging.setup(username, "post", current_page, POSTS_EACH_PAGE)
 
         post_utils = PostUtils(mongodb)
         posts = post_utils.get_post_infos_with_pagination(
-            username=username, page_number=current_page, posts_per_page=POSTS_EACH_PAGE
+            username=username,
+            page_number=current_page,
+            posts_per_page=POSTS_EACH_PAGE,
+            after=(after, after_uid) if after and after_uid else None,
         )
 
         user_utils = UserUtils(mongodb)
@@ -91,8 +97,19 @@ def blog(username: str) -> str:
         tags = {tag: count for tag, count in tags.items() if count > 0}
         user_utils.total_view_increment(username)
 
+    # seek cursor for the next page
+    next_cursor = {}
+    if posts:
+        next_cursor["after"] = posts[-1].get("created_at").isoformat()
+        next_cursor["after_uid"] = posts[-1].get("post_uid")
+
     return render_template(
-        "frontstage/blog.html", user=user, posts=posts, tags=tags, pagination=pagination
+        "frontstage/blog.html",
+        user=user,
+        posts=posts,
+        tags=tags,
+        pagination=pagination,
+        next_cursor=next_cursor,
     )
 
 
@@ -138,15 +155,16 @@ def blogpost_no_slug(username: str, post_uid: str) -> str:
     """
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
-        if not mongodb.post_info.exists("post_uid", post_uid):
-            logger.debug(f"Invalid post uid {post_uid}.")
+        # the full post is memoized for this request, `blogpost()` reuses it for rendering
+        post_info = PostUtils(mongodb).get_full_post(post_uid)
+        if post_info is None:
+            logger.debug("Invalid post uid %s.", post_uid)
             abort(404)
-        post_info = mongodb.post_info.find_one({"post_uid": post_uid})
 
     if username != post_info.get("author"):
-        logger.debug(f"User {username} does not own post {post_uid}.")
+        logger.debug("User %s does not own post %s.", username, post_uid)
         abort(404)
 
     custom_slug = post_info.get("custom_slug")
@@ -169,15 +187,16 @@ def blogpost_with_slug(username: str, post_uid: str, slug: str) -> str:
     """
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
-        if not mongodb.post_info.exists("post_uid", post_uid):
-            logger.debug(f"Invalid post uid {post_uid}.")
+        # the full post is memoized for this request, `blogpost()` reuses it for rendering
+        post_info = PostUtils(mongodb).get_full_post(post_uid)
+        if post_info is None:
+            logger.debug("Invalid post uid %s.", post_uid)
             abort(404)
-        post_info = mongodb.post_info.find_one({"post_uid": post_uid})
 
     if username != post_info.get("author"):
-        logger.debug(f"User {username} does not own post {post_uid}.")
+        logger.debug("User %s does not own post %s.", username, post_uid)
         abort(404)
 
     actual_slug = post_info.get("custom_slug")
@@ -203,7 +222,7 @@ def tag(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
 
         tag_url_encoded = request.args.get("tag", default=None, type=str)
@@ -215,11 +234,11 @@ def tag(username: str) -> str:
         user = user_utils.get_user_info(username)
 
         post_utils = PostUtils(mongodb)
-        posts = post_utils.get_post_infos(username)
+        posts = post_utils.get_post_infos(username, projection=POST_SUMMARY_PROJECTION)
         posts_with_desired_tag = [post for post in posts if tag in post.get("tags")]
 
         projects_utils = ProjectsUtils(mongodb)
-        projects = projects_utils.get_project_infos(username)
+        projects = projects_utils.get_project_infos(username, projection=PROJECT_SUMMARY_PROJECTION)
         projects_with_desired_tag = [project for project in projects if tag in project.get("tags")]
 
         user_utils.total_view_increment(username)
@@ -243,12 +262,12 @@ def gallery(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
         user_utils = UserUtils(mongodb)
         user = user_utils.get_user_info(username)
         if not user.gallery_enabled:
-            logger.debug(f"User {username} did not enable gallery feature.")
+            logger.debug("User %s did not enable gallery feature.", username)
             abort(404)
 
         current_page = request.args.get("page", default=1, type=int)
@@ -301,15 +320,16 @@ def project_no_slug(username: str, project_uid: str) -> str:
     """
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
-        if not mongodb.project_info.exists("project_uid", project_uid):
-            logger.debug(f"Invalid project uid {project_uid}.")
+        # the full project is memoized for this request, `project()` reuses it for rendering
+        project_info = ProjectsUtils(mongodb).get_full_project(project_uid)
+        if project_info is None:
+            logger.debug("Invalid project uid %s.", project_uid)
             abort(404)
-        project_info = mongodb.project_info.find_one({"project_uid": project_uid})
 
     if username != project_info.get("author"):
-        logger.debug(f"User {username} does not own project {project_uid}.")
+        logger.debug("User %s does not own project %s.", username, project_uid)
         abort(404)
 
     custom_slug = project_info.get("custom_slug")
@@ -332,15 +352,16 @@ def project_with_slug(username: str, project_uid: str, slug: str) -> str:
     """
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
-        if not mongodb.project_info.exists("project_uid", project_uid):
-            logger.debug(f"Invalid project uid {project_uid}.")
+        # the full project is memoized for this request, `project()` reuses it for rendering
+        project_info = ProjectsUtils(mongodb).get_full_project(project_uid)
+        if project_info is None:
+            logger.debug("Invalid project uid %s.", project_uid)
             abort(404)
-        project_info = mongodb.project_info.find_one({"project_uid": project_uid})
 
     if username != project_info.get("author"):
-        logger.debug(f"User {username} does not own project {project_uid}.")
+        logger.debug("User %s does not own project %s.", username, project_uid)
         abort(404)
 
     actual_slug = project_info.get("custom_slug")
@@ -366,12 +387,12 @@ def changelog(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
         user_utils = UserUtils(mongodb)
         user = user_utils.get_user_info(username)
         if not user.changelog_enabled:
-            logger.debug(f"User {username} did not enable changelog feature.")
+            logger.debug("User %s did not enable changelog feature.", username)
             abort(404)
         changelog_utils = ChangelogUtils(mongodb)
         changelogs = changelog_utils.get_changelogs(username, by_date=True)
@@ -392,14 +413,12 @@ def about(username: str) -> str:
 
     with mongo_connection() as mongodb:
         if not mongodb.user_info.exists("username", username):
-            logger.debug(f"Invalid username {username}.")
+            logger.debug("Invalid username %s.", username)
             abort(404)
 
         user = mongodb.user_info.find_one({"username": username})
-        about = mongodb.user_about.find_one({"username": username}).get("about")
-        about = convert_about(about)
-
         user_utils = UserUtils(mongodb)
+        about = convert_about(user_utils.get_user_about(username).about)
         user_utils.total_view_increment(username)
 
     return render_template("frontstage/about.html", user=user, about=about)
@@ -441,7 +460,9 @@ def readcount_increment() -> str:
     if content == "post":
         post_uid = request.args.get("post_uid", type=str)
         with mongo_connection() as mongodb:
-            author = mongodb.post_info.find_one({"post_uid": post_uid}).get("author")
+            author = mongodb.post_info.find_one_fields({"post_uid": post_uid}, "author").get(
+                "author"
+            )
             if current_user.is_authenticated and current_user.username == author:
                 return "OK"
             post_utils = PostUtils(mongodb)
@@ -451,7 +472,9 @@ def readcount_increment() -> str:
     elif content == "project":
         project_uid = request.args.get("project_uid", type=str)
         with mongo_connection() as mongodb:
-            author = mongodb.project_info.find_one({"project_uid": project_uid}).get("author")
+            author = mongodb.project_info.find_one_fields(
+                {"project_uid": project_uid}, "author"
+            ).get("author")
             if current_user.is_authenticated and current_user.username == author:
                 return "OK"
             projects_utils = ProjectsUtils(mongodb)
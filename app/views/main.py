@@ -1,15 +1,17 @@
+from collections.abc import Iterator
 from datetime import datetime, timezone
 
-import bcrypt
 from flask import (
     Blueprint,
     Response,
+    current_app,
     flash,
-    make_response,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_template,
     url_for,
 )
 from flask_login import current_user, login_required, login_user, logout_user
@@ -17,8 +19,13 @@ from flask_login import current_user, login_required, login_user, logout_user
 from app.config import DOMAIN, ENV, TEMPLATE_FOLDER
 from app.forms.users import LoginForm, SignUpForm
 from app.helpers.posts import PostUtils
-from app.helpers.projects import ProjectsUtils
-from app.helpers.users import UserUtils
+from app.helpers.users import (
+    UserUtils,
+    hash_password,
+    password_needs_rehash,
+    user_info_cache,
+    verify_password,
+)
 from app.logging import logger, logger_utils
 from app.mongo import mongo_connection
 
@@ -57,23 +64,24 @@ def login() -> str:
     """
     if current_user.is_authenticated:
         flash("You are already logged in.")
-        logger.debug(f"Attempt to duplicate logging from user {current_user.username}.")
+        logger.debug("Attempt to duplicate logging from user %s.", current_user.username)
         return redirect(url_for("baskstage.root", username=current_user.username))
 
     form = LoginForm()
 
     if form.validate_on_submit():
         with mongo_connection() as mongodb:
-            if not mongodb.user_creds.exists("email", form.email.data):
+            user_creds = mongodb.user_creds.find_one_fields(
+                {"email": form.email.data}, "username", "password"
+            )
+            if user_creds is None:
                 flash("Account not found. Please try again.", category="error")
                 logger_utils.login_failed(request=request, msg=f"email {form.email.data} not found")
                 return render_template("main/login.html", form=form)
 
-            user_creds = mongodb.user_creds.find_one({"email": form.email.data})
-            encoded_input_pw = form.password.data.encode("utf8")
-            encoded_valid_user_pw = user_creds.get("password").encode("utf8")
+            valid_user_pw = user_creds.get("password")
 
-            if not bcrypt.checkpw(encoded_input_pw, encoded_valid_user_pw):
+            if not verify_password(form.password.data, valid_user_pw):
                 flash("Invalid password. Please try again.", category="error")
                 logger_utils.login_failed(
                     request=request,
@@ -82,6 +90,11 @@ def login() -> str:
                 return render_template("main/login.html", form=form)
 
             username = user_creds.get("username")
+            if password_needs_rehash(valid_user_pw):
+                mongodb.user_creds.update_values(
+                    filter={"username": username},
+                    update={"password": hash_password(form.password.data)},
+                )
             user_utils = UserUtils(mongodb)
             user = user_utils.get_user_info(username)
 
@@ -129,12 +142,27 @@ def logout() -> Response:
     else:
         logout_redirect = redirect(session["last_visited"])
     logout_user()
+    user_info_cache.invalidate(username)
     logger_utils.logout(request=request, username=username)
     session.clear()
 
     return logout_redirect
 
 
+@main.route("/healthz", methods=["GET"])
+def healthz() -> Response:
+    """
+    Health check of the app.
+    The `db_ready` key tells whether the MongoDB connection has been verified.
+
+    Answers 503 once the MongoDB setup has failed for good, while the process is shutting down.
+    """
+    db_ready = current_app.config.get("DB_READY", False)
+    if current_app.config.get("DB_FAILED", False):
+        return jsonify({"status": "failed", "db_ready": db_ready}), 503
+    return jsonify({"status": "ok", "db_ready": db_ready})
+
+
 @main.route("/robots.txt", methods=["GET"])
 def robotstxt() -> str:
     """
@@ -145,103 +173,89 @@ def robotstxt() -> str:
     return Response(content, mimetype="text/plain")
 
 
-@main.route("/sitemap.xml")
-def sitemap() -> str:
+def _sitemap_urls(base_url: str) -> Iterator[dict]:
     """
-    Generate the sitemap for the website.
+    Yields the sitemap entries one by one: the landing page, then all users, posts and projects.
 
-    It looks into the database and retrieves all users, posts and projects, then put them into the sitemap.
+    Posts and projects are read from one aggregation cursor in batches, so the memory used doesn't grow with their number.
     """
-    if ENV == "dev":
-        base_url = f"{DOMAIN}"
-    else:
-        base_url = f"https://{DOMAIN}"
-
     today = datetime.today().date()
-    urls = [
-        {"loc": f"{base_url}/", "lastmod": today, "changefreq": "daily", "priority": 1},
-    ]
+    yield {"loc": f"{base_url}/", "lastmod": today, "changefreq": "daily", "priority": 1}
 
     with mongo_connection() as mongodb:
         user_utils = UserUtils(mongodb)
         post_utils = PostUtils(mongodb)
-        projects_utils = ProjectsUtils(mongodb)
 
         for username in user_utils.get_all_username():
-            urls.extend(
-                [
-                    {
-                        "loc": f"{base_url}/@{username}",
-                        "lastmod": today,
-                        "changefreq": "monthly",
-                        "priority": 0.6,
-                    },
-                    {
-                        "loc": f"{base_url}/@{username}/blog",
-                        "lastmod": today,
-                        "changefreq": "monthly",
-                        "priority": 0.6,
-                    },
-                    {
-                        "loc": f"{base_url}/@{username}/about",
-                        "lastmod": today,
-                        "changefreq": "monthly",
-                        "priority": 0.6,
-                    },
-                ]
-            )
+            yield {
+                "loc": f"{base_url}/@{username}",
+                "lastmod": today,
+                "changefreq": "monthly",
+                "priority": 0.6,
+            }
+            yield {
+                "loc": f"{base_url}/@{username}/blog",
+                "lastmod": today,
+                "changefreq": "monthly",
+                "priority": 0.6,
+            }
+            yield {
+                "loc": f"{base_url}/@{username}/about",
+                "lastmod": today,
+                "changefreq": "monthly",
+                "priority": 0.6,
+            }
         for username in user_utils.get_all_username_gallery_enabled():
-            urls.append(
-                {
-                    "loc": f"{base_url}/@{username}/gallery",
-                    "lastmod": today,
-                    "changefreq": "monthly",
-                    "priority": 0.6,
-                }
-            )
+            yield {
+                "loc": f"{base_url}/@{username}/gallery",
+                "lastmod": today,
+                "changefreq": "monthly",
+                "priority": 0.6,
+            }
         for username in user_utils.get_all_username_changelog_enabled():
-            urls.append(
-                {
-                    "loc": f"{base_url}/@{username}/changelog",
-                    "lastmod": today,
-                    "changefreq": "monthly",
-                    "priority": 0.6,
-                }
-            )
-
-        for post in post_utils.get_all_posts_info():
-            slug = post.get("custom_slug")
-            lastmod = (
-                post.get("last_updated")
-                .replace(tzinfo=timezone.utc)
-                .strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-            lastmod = lastmod[:-2] + ":" + lastmod[-2:]
-            url = {
-                "loc": f"{base_url}/@{post.get('author')}/posts/{post.get('post_uid')}/{slug if slug else ''}",
-                "lastmod": lastmod,
+            yield {
+                "loc": f"{base_url}/@{username}/changelog",
+                "lastmod": today,
                 "changefreq": "monthly",
                 "priority": 0.6,
             }
-            urls.append(url)
 
-        for project in projects_utils.get_all_projects_info():
-            slug = project.get("custom_slug")
+        for entry in post_utils.iter_sitemap_entries():
+            slug = entry.get("slug")
             lastmod = (
-                project.get("last_updated")
+                entry.get("last_updated")
                 .replace(tzinfo=timezone.utc)
                 .strftime("%Y-%m-%dT%H:%M:%S%z")
             )
             lastmod = lastmod[:-2] + ":" + lastmod[-2:]
-            url = {
-                "loc": f"{base_url}/@{project.get('author')}/projects/{project.get('project_uid')}/{slug if slug else ''}",
-                "lastmod": lastmod,
-            }
-            urls.append(url)
+            if entry.get("type") == "post":
+                yield {
+                    "loc": f"{base_url}/@{entry.get('author')}/posts/{entry.get('uid')}/{slug if slug else ''}",
+                    "lastmod": lastmod,
+                    "changefreq": "monthly",
+                    "priority": 0.6,
+                }
+            else:
+                yield {
+                    "loc": f"{base_url}/@{entry.get('author')}/project/{entry.get('uid')}/{slug if slug else ''}",
+                    "lastmod": lastmod,
+                }
 
-    xml_sitemap = render_template("main/sitemap.xml", urls=urls)
-    response = make_response(xml_sitemap)
-    response.headers["Content-Type"] = "application/xml"
     logger.debug("Sitemap generated successfully.")
 
-    return response
+
+@main.route("/sitemap.xml")
+def sitemap() -> Response:
+    """
+    Generate the sitemap for the website.
+
+    It looks into the database and retrieves all users, posts and projects, then put them into the sitemap.
+    The sitemap is streamed to the client while the entries are being read from the database.
+    """
+    if ENV == "dev":
+        base_url = f"{DOMAIN}"
+    else:
+        base_url = f"https://{DOMAIN}"
+
+    xml_sitemap = stream_template("main/sitemap.xml", urls=_sitemap_urls(base_url))
+    return Response(xml_sitemap, mimetype="application/xml")